@@ -0,0 +1,139 @@
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from model import *
+from graph_functions import *
+from simulation_functions import *
+from offloading_functions import *
+from grasp_functions import *
+from instrumentation import Profiler, NullSink
+
+PHASES = ('create_offloading_graph', 'clone_offloading_graph', 'generate_initial_solution', 'bottleneck_assignment', 'local_search', 'update_vehicle_positions', 'update_graph')
+
+def timed_runs(VUs, RSUs, HAP, initial_vu_states, rsu_index, alpha, number_of_runs):
+    profiler = Profiler(NullSink())
+    # Keep capacity messages out of the JSON report on stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        best_latency, _, _ = best_of_runs(VUs, RSUs, HAP, initial_vu_states, alpha, number_of_runs, rsu_index,
+                                          profiler=profiler)
+
+    summary = profiler.summary()
+    phase_times = {phase: summary['phase_time_s'].get(phase, 0.0) for phase in PHASES}
+    return phase_times, summary['counters'], best_latency
+
+def benchmark_scenario(scenario, number_of_runs, alpha=0.498, seed=0):
+    previous = apply_scenario(**scenario)
+    try:
+        random.seed(seed)
+        VUs = initialise_VUs()
+        RSUs = initialise_RSUs()
+        HAP = initialise_HAP()
+        rsu_index = RSUCoverageIndex(RSUs)
+        initial_vu_states = store_initial_vu_states(VUs)
+
+        start = time.perf_counter()
+        phase_times, counters, best_latency = timed_runs(VUs, RSUs, HAP, initial_vu_states, rsu_index, alpha, number_of_runs)
+        total_time = time.perf_counter() - start
+
+        # Peak memory comes from one extra traced run so tracing does not skew the timings
+        tracemalloc.start()
+        timed_runs(VUs, RSUs, HAP, initial_vu_states, rsu_index, alpha, 1)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    finally:
+        apply_scenario(**previous)
+
+    return {
+        'scenario': scenario,
+        'number_of_runs': number_of_runs,
+        'alpha': alpha,
+        'seed': seed,
+        'total_time_s': total_time,
+        'phase_time_s': phase_times,
+        'counters': counters,
+        'best_latency': best_latency,
+        'peak_memory_bytes': peak_memory
+    }
+
+def run_benchmarks(VU_m_values, RSU_n_values, max_tasks_values, l_values, run_values, alpha=0.498, seed=0):
+    results = []
+    for VU_m, RSU_n, max_tasks_per_VU, l, number_of_runs in itertools.product(
+            VU_m_values, RSU_n_values, max_tasks_values, l_values, run_values):
+        scenario = {'VU_m': VU_m, 'RSU_n': RSU_n, 'max_tasks_per_VU': max_tasks_per_VU, 'l': l}
+        result = benchmark_scenario(scenario, number_of_runs, alpha, seed)
+        print(f"{scenario} runs={number_of_runs}: {result['total_time_s']:.3f}s, "
+              f"peak {result['peak_memory_bytes'] / 2**20:.1f} MiB", file=sys.stderr)
+        results.append(result)
+    return results
+
+def result_key(result):
+    return json.dumps([result['scenario'], result['number_of_runs'], result['alpha'], result['seed']], sort_keys=True)
+
+def compare_results(results, baseline_results, tolerance, min_time=0.01):
+    # Returns a message for every phase that got slower than the baseline by more than tolerance,
+    # phases faster than min_time seconds are too noisy to compare
+    baseline = {result_key(result): result for result in baseline_results}
+    regressions = []
+    for result in results:
+        previous = baseline.get(result_key(result))
+        if previous is None:
+            continue
+        for phase in PHASES:
+            # Reports from older versions may not time every phase
+            before, after = previous['phase_time_s'].get(phase), result['phase_time_s'].get(phase)
+            if before is None or after is None:
+                continue
+            if before >= min_time and after > before * (1 + tolerance):
+                regressions.append(f"{result['scenario']} runs={result['number_of_runs']} {phase}: {before:.4f}s -> {after:.4f}s")
+    return regressions
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time each GRASP phase over a sweep of scenario sizes.")
+    parser.add_argument('--VU_m', type=int, nargs='+', default=[VU_m])
+    parser.add_argument('--RSU_n', type=int, nargs='+', default=[RSU_n])
+    parser.add_argument('--max_tasks_per_VU', type=int, nargs='+', default=[max_tasks_per_VU])
+    parser.add_argument('--l', type=float, nargs='+', default=[l])
+    parser.add_argument('--runs', type=int, nargs='+', default=[10])
+    parser.add_argument('--alpha', type=float, default=0.498)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    parser.add_argument('--compare', help="Earlier JSON report to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown per phase, 0.2 is 20%%")
+    parser.add_argument('--min-time', type=float, default=0.01, help="Ignore phases faster than this many seconds")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.VU_m, args.RSU_n, args.max_tasks_per_VU, args.l, args.runs, args.alpha, args.seed)
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'timestamp': time.time(),
+        'results': results
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare_results(results, json.load(f)['results'], args.tolerance, args.min_time)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            raise SystemExit(1)
@@ -0,0 +1,75 @@
+import heapq
+import numpy as np
+
+class CapacityLedger:
+    # Slots in use on each server, the RSUs followed by the HAP, kept in one count array so a
+    # snapshot or rollback is a single copy. Reserving and releasing a slot are O(1). A held
+    # slot can also be given a release time and is then freed by release_due once that time passes.
+    def __init__(self, servers, limits):
+        self.servers = list(servers)
+        self.index = {server: i for i, server in enumerate(self.servers)}
+        self.limits = np.asarray(limits, dtype=np.int64)
+        self.counts = np.zeros(len(self.servers), dtype=np.int64)
+        self.releases = []  # Heap of (release_time, sequence, server index)
+        self.sequence = 0  # Keeps releases at the same time in scheduling order
+
+    @classmethod
+    def from_servers(cls, RSUs, HAP):
+        return cls(list(RSUs) + ['HAP'], [rsu['max_tasks'] for rsu in RSUs.values()] + [HAP['max_tasks']])
+
+    @classmethod
+    def from_solution(cls, RSUs, HAP, solution):
+        # Ledger holding one slot for every task assigned in solution
+        ledger = cls.from_servers(RSUs, HAP)
+        for target, _ in solution.values():
+            ledger.counts[ledger.index[target]] += 1
+        return ledger
+
+    def has_capacity(self, server):
+        i = self.index.get(server)
+        return i is not None and self.counts[i] < self.limits[i]
+
+    def free_slots(self, server):
+        i = self.index[server]
+        return int(self.limits[i] - self.counts[i])
+
+    def reserve(self, server):
+        # Takes a slot on server, returns False and changes nothing when it is full
+        i = self.index[server]
+        if self.counts[i] >= self.limits[i]:
+            return False
+        self.counts[i] += 1
+        return True
+
+    def release(self, server):
+        i = self.index[server]
+        if self.counts[i] <= 0:
+            raise ValueError(f"No slot held on {server}")
+        self.counts[i] -= 1
+
+    def move(self, from_server, to_server):
+        # Moves a held slot, the caller has checked to_server has capacity
+        self.release(from_server)
+        self.counts[self.index[to_server]] += 1
+
+    def release_at(self, server, release_time):
+        # The slot held on server is freed by the first release_due at or after release_time
+        heapq.heappush(self.releases, (release_time, self.sequence, self.index[server]))
+        self.sequence += 1
+
+    def release_due(self, now):
+        released = 0
+        while self.releases and self.releases[0][0] <= now:
+            _, _, i = heapq.heappop(self.releases)
+            self.counts[i] -= 1
+            released += 1
+        return released
+
+    def snapshot(self):
+        return self.counts.copy(), list(self.releases), self.sequence
+
+    def rollback(self, snapshot):
+        counts, releases, sequence = snapshot
+        np.copyto(self.counts, counts)
+        self.releases = list(releases)
+        self.sequence = sequence
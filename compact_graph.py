@@ -0,0 +1,76 @@
+import networkx as nx
+import numpy as np
+
+class CompactOffloadingGraph:
+    # Array-backed bipartite task -> server graph. The edges of task t are
+    # indices[indptr[t]:indptr[t + 1]] with the matching entries of weights.
+    # Tasks are removed by clearing task_alive rather than rebuilding the arrays.
+    def __init__(self, task_nodes, task_vus, vu_ids, server_nodes, rsu_count, rsu_latency, hap_latency, max_latency_ms):
+        self.task_nodes = list(task_nodes)
+        self.task_index = {task_node: i for i, task_node in enumerate(self.task_nodes)}
+        self.task_vus = np.asarray(task_vus, dtype=np.int64)  # Index into vu_ids for each task
+        self.vu_ids = list(vu_ids)
+        self.server_nodes = list(server_nodes)
+        self.server_index = {server: i for i, server in enumerate(self.server_nodes)}
+        self.rsu_count = rsu_count  # Server ids below this are RSUs, the last one is the HAP
+
+        # Per-task latencies and deadlines, fixed for the lifetime of the graph
+        self.rsu_latency = np.asarray(rsu_latency, dtype=float)
+        self.hap_latency = np.asarray(hap_latency, dtype=float)
+        self.max_latency_ms = np.asarray(max_latency_ms)
+
+        self.task_alive = np.ones(len(self.task_nodes), dtype=bool)
+        self.set_edges(np.zeros(len(self.task_nodes) + 1, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0))
+
+    def set_edges(self, indptr, indices, weights):
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.degrees = np.diff(indptr)
+        self.edge_count = int(self.degrees[self.task_alive].sum())
+
+    def number_of_edges(self):
+        return self.edge_count
+
+    def number_of_tasks(self):
+        return int(self.task_alive.sum())
+
+    def task_nodes_alive(self):
+        return [self.task_nodes[i] for i in np.flatnonzero(self.task_alive).tolist()]
+
+    def task_edges(self, task_node):
+        # Returns [(server, weight)] in insertion order, empty once the task is removed
+        i = self.task_index.get(task_node)
+        if i is None or not self.task_alive[i]:
+            return []
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return [(self.server_nodes[server], weight)
+                for server, weight in zip(self.indices[start:end].tolist(), self.weights[start:end].tolist())]
+
+    def remove_task_nodes(self, task_nodes):
+        for task_node in task_nodes:
+            i = self.task_index[task_node]
+            if self.task_alive[i]:
+                self.task_alive[i] = False
+                self.edge_count -= int(self.degrees[i])
+
+    def server_type(self, server_id):
+        return 'RSU' if server_id < self.rsu_count else 'HAP'
+
+    def copy(self):
+        # The edge arrays are replaced rather than mutated, so clones can share them
+        clone = object.__new__(CompactOffloadingGraph)
+        clone.__dict__.update(self.__dict__)
+        clone.task_alive = self.task_alive.copy()
+        return clone
+
+    def to_networkx(self):
+        # Adapter back to the DiGraph layout used by create_offloading_graph, for debugging
+        G = nx.DiGraph()
+        for i in np.flatnonzero(self.task_alive).tolist():
+            task_node = self.task_nodes[i]
+            G.add_node(task_node)
+            start, end = self.indptr[i], self.indptr[i + 1]
+            for server, weight in zip(self.indices[start:end].tolist(), self.weights[start:end].tolist()):
+                G.add_edge(task_node, self.server_nodes[server], weight=weight, type=self.server_type(server))
+        return G
@@ -0,0 +1,213 @@
+import argparse
+import asyncio
+import json
+import math
+import re
+from model import *
+from graph_functions import *
+from simulation_functions import *
+from offloading_functions import *
+from grasp_functions import *
+
+# Newline-delimited JSON over TCP or a Unix socket, one request object per line:
+#   {"op": "update", "vus": {"VU_1": {"position": 120.5, "direction": "left"}}}
+#   {"op": "decide", "vus": {...optional updates...}, "vu_ids": ["VU_1"]}
+# A decide reply is {"decision_vector": {"VU_1_Task 1": 1, ...}, "latency": ..., "batch_size": ...}
+# using get_offloading_option's encoding, limited to vu_ids when given. Errors come back as {"error": ...}.
+# VU ids must look like VU_<n>, the graph functions read the VU back from a task node's name.
+
+VU_FIELDS = ('position', 'direction', 'speed', 'GFLOPS', 'tasks')
+VU_ID_PATTERN = re.compile(r'VU_[1-9][0-9]*')  # Task nodes are named '<vu_id>_<task id>' and parsed back by graph_vu_tasks
+TASK_FIELDS = ('id', 'size_MB', 'max_latency_ms')
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def validate_vu_update(vu_id, fields):
+    # Raises ValueError unless fields is a well-formed update for one VU
+    if not isinstance(vu_id, str) or not VU_ID_PATTERN.fullmatch(vu_id):
+        raise ValueError(f"Invalid VU id {vu_id!r}, expected VU_<n> such as VU_1")
+    if not isinstance(fields, dict):
+        raise ValueError(f"Update for {vu_id} must be an object")
+    unknown = set(fields) - set(VU_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown VU fields for {vu_id}: {sorted(unknown)}")
+    for name in ('position', 'speed', 'GFLOPS'):
+        if name in fields and not is_number(fields[name]):
+            raise ValueError(f"{name} for {vu_id} must be a number")
+    if 'speed' in fields and fields['speed'] < 0 or 'GFLOPS' in fields and fields['GFLOPS'] <= 0:
+        raise ValueError(f"speed for {vu_id} must be non-negative and GFLOPS positive")
+    if 'direction' in fields and fields['direction'] not in ('left', 'right'):
+        raise ValueError(f"Invalid direction for {vu_id}: {fields['direction']}")
+    if 'tasks' in fields:
+        tasks = fields['tasks']
+        if not isinstance(tasks, list) or not all(isinstance(task, dict) and set(task) == set(TASK_FIELDS) for task in tasks):
+            raise ValueError(f"tasks for {vu_id} must be a list of objects with {list(TASK_FIELDS)}")
+        for task in tasks:
+            if not isinstance(task['id'], str) or not is_number(task['size_MB']) or not is_number(task['max_latency_ms']) \
+               or task['size_MB'] <= 0:
+                raise ValueError(f"Invalid task for {vu_id}: {task}")
+        if len({task['id'] for task in tasks}) != len(tasks):
+            raise ValueError(f"Duplicate task ids for {vu_id}")
+
+class DecisionService:
+    # Keeps the scenario, RSU index and initial graph warm between requests. Updates patch the kept
+    # graph through an incremental update_graph tracker, so only the edges of tasks whose VU changed
+    # RSU or whose inputs changed are rebuilt. Decide requests that arrive within batch_window_s of
+    # each other are answered by one solver call.
+    def __init__(self, VUs=None, RSUs=None, HAP=None, alpha=0.498, number_of_runs=10, batch_window_s=0.005,
+                 profiler=NULL_PROFILER):
+        self.VUs = VUs if VUs is not None else initialise_VUs()
+        self.RSUs = RSUs if RSUs is not None else initialise_RSUs()
+        self.HAP = HAP if HAP is not None else initialise_HAP()
+        self.rsu_index = RSUCoverageIndex(self.RSUs)
+        self.alpha = alpha
+        self.number_of_runs = number_of_runs
+        self.batch_window_s = batch_window_s
+        self.profiler = profiler
+        self.template = None  # Initial graph for the current VU state, built on the first solve
+        self.tracker = create_graph_tracker()  # Keeps the template's edges in step with VU updates
+        self.pending = []  # (request, future) waiting for the next solver call
+        self.flush_task = None
+        self.solver_lock = asyncio.Lock()
+        self.solves = 0
+
+    def apply_updates(self, updates):
+        # Validates every update before changing anything, so a bad request leaves the state as it was
+        if not isinstance(updates, dict):
+            raise ValueError("vus must be an object of VU updates")
+        for vu_id, fields in updates.items():
+            validate_vu_update(vu_id, fields)
+            if vu_id not in self.VUs and set(fields) != set(VU_FIELDS):
+                raise ValueError(f"New VU {vu_id} needs all of {list(VU_FIELDS)}")
+
+        for vu_id, fields in updates.items():
+            self.VUs.setdefault(vu_id, {}).update(fields)
+        if updates and self.template is not None:
+            self.refresh_template(updates)
+
+    def refresh_template(self, updates):
+        # Brings the kept graph up to the updated VU state. A VU with a new task list gets its task
+        # nodes replaced, the edges of every updated VU are then checked incrementally.
+        vu_tasks = self.tracker['vu_tasks']
+        for vu_id, fields in updates.items():
+            if 'tasks' not in fields:
+                continue
+            old_nodes = [task_node for task_node in self.template if task_node.startswith(f"{vu_id}_")]
+            self.template.remove_nodes_from(old_nodes)
+            new_tasks = [(f"{vu_id}_{task['id']}", task) for task in self.VUs[vu_id]['tasks']]
+            self.template.add_nodes_from(task_node for task_node, _ in new_tasks)
+            if vu_tasks is not None:
+                for task_node in old_nodes:
+                    self.tracker['task_signatures'].pop(task_node, None)
+                self.tracker['vu_rsus'].pop(vu_id, None)  # Rebuild the edges of every new task
+                vu_tasks[vu_id] = new_tasks
+        with self.profiler.phase('update_graph'):
+            update_graph(self.template, self.VUs, self.RSUs, self.HAP, self.rsu_index, self.tracker, self.profiler,
+                         list(updates), own_rsu_only=True)
+
+    def solve(self):
+        # One best_of_runs from the current state, the VUs are put back where they were afterwards
+        initial_vu_states = store_initial_vu_states(self.VUs)
+        if self.template is None:
+            self.template = create_graph_template(self.VUs, self.RSUs, self.HAP, initial_vu_states, self.rsu_index,
+                                                  profiler=self.profiler)
+        best_latency, best_decision_vector, _ = best_of_runs(
+            self.VUs, self.RSUs, self.HAP, initial_vu_states, self.alpha, self.number_of_runs, self.rsu_index,
+            profiler=self.profiler, template=self.template)
+        reset_vus_to_initial_state(self.VUs, initial_vu_states)
+        self.solves += 1
+        return best_latency, best_decision_vector
+
+    async def handle_request(self, request):
+        if not isinstance(request, dict):
+            raise ValueError("Request must be a JSON object")
+        op = request.get('op')
+        if op == 'update':
+            async with self.solver_lock:  # The VUs move while a solve is running
+                self.apply_updates(request.get('vus', {}))
+            return {'ok': True}
+        if op == 'decide':
+            future = asyncio.get_running_loop().create_future()
+            self.pending.append((request, future))
+            if self.flush_task is None:
+                self.flush_task = asyncio.create_task(self.flush())
+            return await future
+        raise ValueError(f"Unknown op: {op}")
+
+    async def flush(self):
+        await asyncio.sleep(self.batch_window_s)
+        async with self.solver_lock:
+            batch, self.pending, self.flush_task = self.pending, [], None
+            try:
+                await self.answer_batch(batch)
+            finally:
+                # Whatever went wrong, no request in the batch is left waiting
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result({'error': "Request could not be processed"})
+
+    async def answer_batch(self, batch):
+        accepted = []
+        for request, future in batch:
+            try:
+                vu_ids = request.get('vu_ids')
+                if vu_ids is not None and not (isinstance(vu_ids, list) and all(isinstance(vu_id, str) for vu_id in vu_ids)):
+                    raise ValueError("vu_ids must be a list of VU ids")
+                self.apply_updates(request.get('vus', {}))
+                accepted.append((request, future))
+            except Exception as error:
+                future.set_result({'error': str(error)})
+        if not accepted:
+            return
+
+        # The solver is CPU bound, run it off the event loop so new requests keep queueing
+        try:
+            best_latency, decision_vector = await asyncio.get_running_loop().run_in_executor(None, self.solve)
+        except Exception as error:
+            for _, future in accepted:
+                future.set_result({'error': f"Solver failed: {error}"})
+            return
+
+        for request, future in accepted:
+            vu_ids = request.get('vu_ids')
+            if vu_ids is not None:
+                prefixes = tuple(f"{vu_id}_" for vu_id in vu_ids)
+                decisions = {task_node: option for task_node, option in decision_vector.items()
+                             if task_node.startswith(prefixes)}
+            else:
+                decisions = decision_vector
+            future.set_result({'decision_vector': decisions, 'latency': best_latency, 'batch_size': len(accepted)})
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                try:
+                    response = await self.handle_request(json.loads(line))
+                except Exception as error:
+                    response = {'error': str(error)}
+                writer.write((json.dumps(response) + '\n').encode())
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765, path=None):
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve GRASP decision vectors over a local socket.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help="Listen on this Unix socket path instead of TCP")
+    parser.add_argument('--alpha', type=float, default=0.498)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--batch-window-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    service = DecisionService(alpha=args.alpha, number_of_runs=args.runs, batch_window_s=args.batch_window_ms / 1000)
+    asyncio.run(service.serve(args.host, args.port, args.unix))
@@ -0,0 +1,188 @@
+import argparse
+import contextlib
+import json
+import sqlite3
+import sys
+import time
+import numpy as np
+from model import *
+from graph_functions import *
+from simulation_functions import *
+from offloading_functions import *
+from grasp_functions import *
+
+# Replications of test()/basic() stored in SQLite, one row per replication. A sweep that is
+# interrupted carries on from the first missing replication when run again with the same name.
+
+METHODS = ('grasp', 'basic', 'bottleneck')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments (
+    name TEXT PRIMARY KEY,
+    method TEXT NOT NULL,
+    scenario TEXT NOT NULL,
+    alpha REAL,
+    number_of_runs INTEGER NOT NULL,
+    base_seed INTEGER NOT NULL,
+    task_nodes TEXT
+);
+CREATE TABLE IF NOT EXISTS replications (
+    experiment TEXT NOT NULL REFERENCES experiments(name),
+    replication INTEGER NOT NULL,
+    seed INTEGER NOT NULL,
+    latency REAL NOT NULL,
+    round_latencies BLOB NOT NULL,
+    decisions BLOB NOT NULL,
+    elapsed_s REAL NOT NULL,
+    PRIMARY KEY (experiment, replication)
+);
+"""
+
+class ExperimentStore:
+    # round_latencies are float64 arrays and decisions int8 arrays from pack_decision_vector,
+    # stored as raw bytes. Task order is kept once per experiment.
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def register(self, name, method, scenario, alpha, number_of_runs, base_seed):
+        # Creates the experiment, or checks that an existing one has the same parameters
+        row = self.connection.execute(
+            "SELECT method, scenario, alpha, number_of_runs, base_seed FROM experiments WHERE name = ?", (name,)).fetchone()
+        parameters = (method, json.dumps(scenario, sort_keys=True), alpha, number_of_runs, base_seed)
+        if row is None:
+            with self.connection:
+                self.connection.execute(
+                    "INSERT INTO experiments (name, method, scenario, alpha, number_of_runs, base_seed) VALUES (?, ?, ?, ?, ?, ?)",
+                    (name, *parameters))
+        elif tuple(row) != parameters:
+            raise ValueError(f"Experiment {name} already exists with different parameters: {tuple(row)}")
+
+    def task_nodes(self, name, task_nodes=None):
+        # Returns the experiment's task order, recording task_nodes as that order on first use
+        row = self.connection.execute("SELECT task_nodes FROM experiments WHERE name = ?", (name,)).fetchone()
+        if row[0] is not None:
+            stored = json.loads(row[0])
+            if task_nodes is not None and task_nodes != stored:
+                raise ValueError(f"Experiment {name} has a different task layout than this replication")
+            return stored
+        if task_nodes is not None:
+            with self.connection:
+                self.connection.execute("UPDATE experiments SET task_nodes = ? WHERE name = ?", (json.dumps(task_nodes), name))
+        return task_nodes
+
+    def completed_replications(self, name):
+        return {row[0] for row in self.connection.execute("SELECT replication FROM replications WHERE experiment = ?", (name,))}
+
+    def add_replication(self, name, replication, seed, latency, round_latencies, decisions, elapsed_s):
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO replications VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (name, replication, seed, latency, np.asarray(round_latencies, dtype=np.float64).tobytes(),
+                 decisions, elapsed_s))
+
+    def summary(self, name):
+        count, mean, mean_square, lowest, highest, elapsed = self.connection.execute(
+            "SELECT COUNT(*), AVG(latency), AVG(latency * latency), MIN(latency), MAX(latency), SUM(elapsed_s) "
+            "FROM replications WHERE experiment = ?", (name,)).fetchone()
+        if not count:
+            return {'replications': 0}
+        variance = max(mean_square - mean * mean, 0.0) * count / (count - 1) if count > 1 else 0.0
+        return {'replications': count, 'mean_latency': mean, 'std_latency': variance ** 0.5,
+                'min_latency': lowest, 'max_latency': highest, 'elapsed_s': elapsed}
+
+    def decision_matrix(self, name):
+        # (replications, tasks) int8 array in replication order, -1 where a task was not offloaded
+        rows = self.connection.execute(
+            "SELECT decisions FROM replications WHERE experiment = ? ORDER BY replication", (name,)).fetchall()
+        task_count = len(self.task_nodes(name) or [])
+        if not rows:
+            return np.empty((0, task_count), dtype=np.int8)
+        return np.frombuffer(b''.join(row[0] for row in rows), dtype=np.int8).reshape(len(rows), task_count)
+
+    def round_latencies(self, name, replication):
+        row = self.connection.execute(
+            "SELECT round_latencies FROM replications WHERE experiment = ? AND replication = ?", (name, replication)).fetchone()
+        return np.frombuffer(row[0], dtype=np.float64) if row else None
+
+    def decision_vector(self, name, replication):
+        row = self.connection.execute(
+            "SELECT decisions FROM replications WHERE experiment = ? AND replication = ?", (name, replication)).fetchone()
+        return unpack_decision_vector(row[0], self.task_nodes(name)) if row else None
+
+    def close(self):
+        self.connection.close()
+
+def replication_seed(base_seed, replication):
+    # 63 bits so the seed fits an SQLite INTEGER
+    return random.Random(f"{base_seed}:{replication}").getrandbits(63)
+
+def run_replication(method, alpha, number_of_runs, seed):
+    # One call of test(), basic() or bottleneck() with its own seed and scenario
+    random.seed(seed)
+    VUs = initialise_VUs()
+    RSUs = initialise_RSUs()
+    HAP = initialise_HAP()
+    rsu_index = RSUCoverageIndex(RSUs)
+    initial_vu_states = store_initial_vu_states(VUs)
+    task_nodes = [f"{vu_id}_{task['id']}" for vu_id, vu in VUs.items() for task in vu['tasks']]
+
+    if method == 'bottleneck':
+        latency, decision_vector, round_latencies = run_grasp(VUs, RSUs, HAP, initial_vu_states, None, rsu_index,
+                                                              solver='bottleneck')
+    else:
+        latency, decision_vector, round_latencies = best_of_runs(VUs, RSUs, HAP, initial_vu_states, alpha,
+                                                                 number_of_runs, rsu_index,
+                                                                 use_local_search=method == 'grasp')
+    return latency, decision_vector, round_latencies, task_nodes
+
+def run_experiment(store, name, replications, method='grasp', scenario=None, alpha=0.498, number_of_runs=100,
+                   base_seed=0):
+    # Runs the replications not already in the store, each committed as soon as it finishes
+    if method not in METHODS:
+        raise ValueError(f"Unknown method: {method}")
+    scenario = scenario or {}
+    store.register(name, method, scenario, alpha, number_of_runs, base_seed)
+    done = store.completed_replications(name)
+
+    previous = apply_scenario(**scenario)
+    try:
+        for replication in range(replications):
+            if replication in done:
+                continue
+            seed = replication_seed(base_seed, replication)
+            start = time.perf_counter()
+            latency, decision_vector, round_latencies, task_nodes = run_replication(method, alpha, number_of_runs, seed)
+            elapsed = time.perf_counter() - start
+            task_nodes = store.task_nodes(name, task_nodes)
+            store.add_replication(name, replication, seed, latency, round_latencies,
+                                  pack_decision_vector(decision_vector, task_nodes), elapsed)
+    finally:
+        apply_scenario(**previous)
+    return store.summary(name)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run replications of test()/basic() into a resumable SQLite store.")
+    parser.add_argument('--db', default='experiments.sqlite')
+    parser.add_argument('--name', required=True, help="Experiment name, rerun with the same name to resume")
+    parser.add_argument('--method', choices=METHODS, default='grasp')
+    parser.add_argument('--replications', type=int, default=1000)
+    parser.add_argument('--runs', type=int, default=100, help="GRASP runs per replication")
+    parser.add_argument('--alpha', type=float, default=0.498)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--summary', action='store_true', help="Only print the stored results")
+    for constant in SCENARIO_CONSTANTS:
+        parser.add_argument(f'--{constant}', type=float if constant in ('l', 'VU_speed') else int)
+    args = parser.parse_args()
+
+    store = ExperimentStore(args.db)
+    try:
+        if not args.summary:
+            scenario = {constant: getattr(args, constant) for constant in SCENARIO_CONSTANTS
+                        if getattr(args, constant) is not None}
+            # Keep capacity messages out of the summary on stdout
+            with contextlib.redirect_stdout(sys.stderr):
+                run_experiment(store, args.name, args.replications, args.method, scenario, args.alpha, args.runs, args.seed)
+        print(json.dumps(store.summary(args.name), indent=2))
+    finally:
+        store.close()
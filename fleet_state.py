@@ -0,0 +1,141 @@
+from collections.abc import Mapping, MutableMapping
+import numpy as np
+from model import *
+
+# Rows of FleetState.state, the part of the fleet that changes while a run is simulated
+POSITION, DIRECTION, SPEED = 0, 1, 2
+
+class VUView(MutableMapping):
+    # Dict-like view of one VU so existing callers can keep using vu['position'] etc.
+    # Task dicts are built from the flat task arrays on first access and are read-only copies.
+    __slots__ = ('fleet', 'index')
+    FIELDS = ('speed', 'GFLOPS', 'position', 'direction', 'tasks')
+
+    def __init__(self, fleet, index):
+        self.fleet = fleet
+        self.index = index
+
+    def __getitem__(self, key):
+        fleet, i = self.fleet, self.index
+        if key == 'position':
+            return float(fleet.state[POSITION, i])
+        if key == 'direction':
+            return 'right' if fleet.state[DIRECTION, i] > 0 else 'left'
+        if key == 'speed':
+            return float(fleet.state[SPEED, i])
+        if key == 'GFLOPS':
+            return float(fleet.gflops[i])
+        if key == 'tasks':
+            return fleet.vu_tasks(i)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        fleet, i = self.fleet, self.index
+        if key == 'position':
+            fleet.state[POSITION, i] = value
+        elif key == 'direction':
+            fleet.state[DIRECTION, i] = 1 if value == 'right' else -1
+        elif key == 'speed':
+            fleet.state[SPEED, i] = value
+        elif key == 'GFLOPS':
+            fleet.gflops[i] = value
+        else:
+            raise KeyError(key)
+
+    def __delitem__(self, key):
+        raise TypeError("VU fields cannot be deleted")
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def copy(self):
+        return dict(self)
+
+class FleetState(Mapping):
+    # Struct-of-arrays VU state. Position, direction (+1 right, -1 left) and speed live in one
+    # (3, VU count) buffer, so a snapshot or restore is a single array copy. Tasks are stored
+    # flat, the tasks of VU i are task_*[task_offsets[i]:task_offsets[i + 1]].
+    def __init__(self, vu_ids, position, direction, speed, gflops, task_counts, task_ids, task_size_MB, task_max_latency_ms):
+        self.vu_ids = list(vu_ids)
+        self.vu_index = {vu_id: i for i, vu_id in enumerate(self.vu_ids)}
+        self.state = np.array([position, direction, speed], dtype=float).reshape(3, len(self.vu_ids))
+        self.gflops = np.asarray(gflops, dtype=float)
+
+        self.task_offsets = np.concatenate([[0], np.cumsum(task_counts, dtype=np.int64)])
+        self.task_owner = np.repeat(np.arange(len(self.vu_ids)), task_counts)
+        self.task_ids = list(task_ids)
+        self.task_size_MB = np.asarray(task_size_MB)
+        self.task_max_latency_ms = np.asarray(task_max_latency_ms)
+
+        self._views = [VUView(self, i) for i in range(len(self.vu_ids))]
+        self._task_lists = [None] * len(self.vu_ids)
+
+    @classmethod
+    def from_VUs(cls, VUs):
+        tasks = [task for vu in VUs.values() for task in vu['tasks']]
+        return cls(
+            VUs.keys(),
+            [vu['position'] for vu in VUs.values()],
+            [1 if vu['direction'] == 'right' else -1 for vu in VUs.values()],
+            [vu['speed'] for vu in VUs.values()],
+            [vu['GFLOPS'] for vu in VUs.values()],
+            [len(vu['tasks']) for vu in VUs.values()],
+            [task['id'] for task in tasks],
+            [task['size_MB'] for task in tasks],
+            [task['max_latency_ms'] for task in tasks]
+        )
+
+    @property
+    def position(self):
+        return self.state[POSITION]
+
+    @property
+    def direction(self):
+        return self.state[DIRECTION]
+
+    @property
+    def speed(self):
+        return self.state[SPEED]
+
+    def __getitem__(self, vu_id):
+        return self._views[self.vu_index[vu_id]]
+
+    def __iter__(self):
+        return iter(self.vu_ids)
+
+    def __len__(self):
+        return len(self.vu_ids)
+
+    def vu_tasks(self, i):
+        if self._task_lists[i] is None:
+            start, end = self.task_offsets[i], self.task_offsets[i + 1]
+            self._task_lists[i] = [
+                {'id': task_id, 'size_MB': size, 'max_latency_ms': max_latency}
+                for task_id, size, max_latency in zip(self.task_ids[start:end],
+                                                      self.task_size_MB[start:end].tolist(),
+                                                      self.task_max_latency_ms[start:end].tolist())
+            ]
+        return self._task_lists[i]
+
+    def task_nodes(self):
+        return [f"{self.vu_ids[owner]}_{task_id}" for owner, task_id in zip(self.task_owner.tolist(), self.task_ids)]
+
+    def update_positions(self, elapsed_time_sec):
+        # Vectorised update_vehicle_positions, VUs stop at either end of the road
+        distance_moved = self.speed * elapsed_time_sec
+        moved_right = np.minimum(self.position + distance_moved, l)
+        moved_left = np.maximum(self.position - distance_moved, 0)
+        self.state[POSITION] = np.where(self.direction > 0, moved_right, moved_left)
+
+    def snapshot(self):
+        return self.state.copy()
+
+    def restore(self, snapshot):
+        np.copyto(self.state, snapshot)
+
+def initialise_fleet():
+    # Same random draws as initialise_VUs, so a seeded scenario matches the dict version
+    return FleetState.from_VUs(initialise_VUs())
@@ -1,5 +1,7 @@
 import networkx as nx
+import numpy as np
 from offloading_functions import *
+from instrumentation import NULL_PROFILER
 
 def print_graph_details(graph):
     print("Current Graph Details:")
@@ -15,30 +17,95 @@ def print_vu_states(VUs):
     for vu_id, vu in VUs.items():
         print(f"{vu_id}: Position={vu['position']}, Direction={vu['direction']}, Tasks={len(vu['tasks'])}")
 
-def create_offloading_graph(VUs, RSUs, HAP):
+def create_offloading_graph(VUs, RSUs, HAP, rsu_index=None):
+    if rsu_index is None:
+        rsu_index = RSUCoverageIndex(RSUs)
+
     G = nx.DiGraph()
+    task_nodes, latencies, deadlines = calculate_task_latencies(VUs)
+    rsu_latencies = latencies['RSU_latency'].tolist()
+    hap_latencies = latencies['HAP_latency'].tolist()
+    deadlines = deadlines.tolist()
+
+    valid_rsus = rsu_index.find_valid_rsus(VUs)
+
+    i = 0  # Index into the flattened task arrays
     for vu_id, vu in VUs.items():
+        valid_rsu = valid_rsus[vu_id]
         for task in vu['tasks']:
-            task_node = f"{vu_id}_{task['id']}"
+            task_node = task_nodes[i]
             G.add_node(task_node)
-            latencies = calculate_latency(task, vu, RSUs, HAP)
 
-            valid_rsu = find_valid_rsu(vu, RSUs)
-            if valid_rsu and latencies['RSU_latency'] <= task['max_latency_ms']:
-                rsu_id = valid_rsu['rsu_id']  
-                G.add_edge(task_node, rsu_id, weight=latencies['RSU_latency'], type='RSU')
+            if valid_rsu and rsu_latencies[i] <= deadlines[i]:
+                rsu_id = valid_rsu['rsu_id']
+                G.add_edge(task_node, rsu_id, weight=rsu_latencies[i], type='RSU')
 
-            if latencies['HAP_latency'] <= task['max_latency_ms']:
-                G.add_edge(task_node, "HAP", weight=latencies['HAP_latency'], type='HAP')
+            if hap_latencies[i] <= deadlines[i]:
+                G.add_edge(task_node, "HAP", weight=hap_latencies[i], type='HAP')
+            i += 1
 
     return G
 
-def update_graph(G, VUs, RSUs, HAP):
-    # Remove unnecessary edges first
-    edges_to_remove = [edge for edge in G.edges(data=True) if 'RSU' in edge[1] or edge[1] == 'HAP']
-    G.remove_edges_from(edges_to_remove)
+def create_compact_offloading_graph(VUs, RSUs, HAP, rsu_index=None):
+    # Same edges as create_offloading_graph, stored in a CompactOffloadingGraph
+    if rsu_index is None:
+        rsu_index = RSUCoverageIndex(RSUs)
+
+    task_nodes, latencies, deadlines = calculate_task_latencies(VUs)
+    vu_ids = list(VUs)
+    task_vus = np.repeat(np.arange(len(vu_ids)), [len(vu['tasks']) for vu in VUs.values()])
+    server_nodes = list(RSUs) + ['HAP']
+
+    G = CompactOffloadingGraph(task_nodes, task_vus, vu_ids, server_nodes, len(RSUs),
+                               latencies['RSU_latency'], latencies['HAP_latency'], deadlines)
+
+    # Each task has at most two edges, its VU's RSU followed by the HAP
+    valid_rsus = rsu_index.find_valid_rsus(VUs)
+    vu_rsu = np.array([G.server_index[rsu['rsu_id']] if rsu else -1 for rsu in valid_rsus.values()], dtype=np.int64)
+    task_rsu = vu_rsu[G.task_vus]
+
+    targets = np.column_stack([task_rsu, np.full(len(task_nodes), len(RSUs))])
+    weights = np.column_stack([G.rsu_latency, G.hap_latency])
+    mask = np.column_stack([(task_rsu >= 0) & (G.rsu_latency <= G.max_latency_ms), G.hap_latency <= G.max_latency_ms])
+    G.set_edges(np.concatenate([[0], np.cumsum(mask.sum(axis=1))]), targets[mask], weights[mask])
+    return G
 
-    # Process each node correctly based on its type
+def update_compact_graph(G, VUs, RSUs, HAP, rsu_index=None, profiler=NULL_PROFILER, own_rsu_only=False):
+    if rsu_index is None:
+        rsu_index = RSUCoverageIndex(RSUs)
+
+    # Rebuild every task's edges in the order update_graph adds them, all RSUs followed by the HAP
+    valid_rsus = rsu_index.find_valid_rsus({vu_id: VUs[vu_id] for vu_id in G.vu_ids})
+    vu_covered = np.array([rsu is not None for rsu in valid_rsus.values()], dtype=bool)
+    task_covered = vu_covered[G.task_vus]
+
+    rsu_ok = task_covered & (G.rsu_latency <= G.max_latency_ms)
+    hap_ok = G.hap_latency <= G.max_latency_ms
+    if own_rsu_only or covering_rsu_only(rsu_index):
+        # Only the VU's own RSU followed by the HAP, as in create_compact_offloading_graph
+        vu_rsu = np.array([G.server_index[rsu['rsu_id']] if rsu else -1 for rsu in valid_rsus.values()], dtype=np.int64)
+        targets = np.column_stack([vu_rsu[G.task_vus], np.full(len(G.task_nodes), G.rsu_count)])
+        weights = np.column_stack([G.rsu_latency, G.hap_latency])
+        mask = np.column_stack([rsu_ok, hap_ok])
+    else:
+        server_count = G.rsu_count + 1
+        targets = np.broadcast_to(np.arange(server_count), (len(G.task_nodes), server_count))
+        weights = np.column_stack([np.repeat(G.rsu_latency[:, None], G.rsu_count, axis=1), G.hap_latency])
+        mask = np.column_stack([np.repeat(rsu_ok[:, None], G.rsu_count, axis=1), hap_ok])
+    profiler.count('edges_removed', G.number_of_edges())
+    G.set_edges(np.concatenate([[0], np.cumsum(mask.sum(axis=1))]), targets[mask], weights[mask])
+    profiler.count('edges_built', G.number_of_edges())
+    return G
+
+def clone_offloading_graph(template):
+    # Every round removes nodes and edges, so each run starts from its own copy of a template
+    # built once per scenario. A networkx copy keeps node and edge order, and a compact graph
+    # shares its edge arrays and only copies the alive mask.
+    return template.copy()
+
+def graph_vu_tasks(G, VUs):
+    # Map the task nodes still in the graph back to (vu_id, task_node, vu, task)
+    remaining = []
     for task_node in list(G.nodes()):
         if task_node.startswith('RSU') or task_node == 'HAP':
             # These are not VU task nodes, skip processing
@@ -61,15 +128,127 @@ def update_graph(G, VUs, RSUs, HAP):
         task = next((t for t in vu['tasks'] if t['id'] == task_id), None)
 
         if task:  # Ensure the task exists
-            latencies = calculate_latency(task, vu, RSUs, HAP)
-            
-            # Reconnect RSUs and HAP if conditions are met
+            remaining.append((vu_id, task_node, vu, task))
+    return remaining
+
+def covering_rsu_only(rsu_index):
+    # The 1D model reconnects a covered task to every RSU after the first round. An index that sets
+    # covering_rsu_only, such as GridRSUIndex, keeps only the VU's own RSU like create_offloading_graph.
+    return getattr(rsu_index, 'covering_rsu_only', False)
+
+def reconnect_tasks(G, tasks, valid_rsus, RSUs, own_rsu_only=False):
+    # Add the RSU and HAP edges of each (vu_id, task_node, vu, task), latencies computed in one batch.
+    # Returns the number of edges added.
+    latencies = calculate_latencies(
+        np.array([task['size_MB'] for _, _, _, task in tasks]),
+        np.array([vu['GFLOPS'] for _, _, vu, _ in tasks])
+    )
+    rsu_latencies = latencies['RSU_latency'].tolist()
+    hap_latencies = latencies['HAP_latency'].tolist()
+    edges_added = 0
+
+    for i, (vu_id, task_node, vu, task) in enumerate(tasks):
+        valid_rsu = valid_rsus[vu_id]
+
+        # Reconnect RSUs and HAP if conditions are met
+        if own_rsu_only:
+            if valid_rsu and rsu_latencies[i] <= task['max_latency_ms']:
+                G.add_edge(task_node, valid_rsu['rsu_id'], weight=rsu_latencies[i], type='RSU')
+                edges_added += 1
+        else:
             for rsu_id, rsu in RSUs.items():
-                valid_rsu = find_valid_rsu(vu, RSUs)
-                if valid_rsu and latencies['RSU_latency'] <= task['max_latency_ms']:
-                    G.add_edge(task_node, rsu_id, weight=latencies['RSU_latency'], type='RSU')
+                if valid_rsu and rsu_latencies[i] <= task['max_latency_ms']:
+                    G.add_edge(task_node, rsu_id, weight=rsu_latencies[i], type='RSU')
+                    edges_added += 1
+
+        if hap_latencies[i] <= task['max_latency_ms']:
+            G.add_edge(task_node, "HAP", weight=hap_latencies[i], type='HAP')
+            edges_added += 1
 
-            if latencies['HAP_latency'] <= task['max_latency_ms']:
-                G.add_edge(task_node, "HAP", weight=latencies['HAP_latency'], type='HAP')
-    
+    return edges_added
+
+def create_graph_tracker():
+    # State kept between incremental update_graph calls
+    return {
+        'vu_tasks': None,  # {vu_id: [(task_node, task)]} for tasks still in the graph
+        'vu_rsus': {},  # RSU each VU was connected to at the last update
+        'task_signatures': {}  # Inputs each task's edges were last built from
+    }
+
+def update_graph(G, VUs, RSUs, HAP, rsu_index=None, tracker=None, profiler=NULL_PROFILER, changed_vus=None,
+                 own_rsu_only=False):
+    # own_rsu_only builds the same edges as create_offloading_graph, to keep a graph of the
+    # initial state up to date rather than advance one between rounds
+    if isinstance(G, CompactOffloadingGraph):
+        return update_compact_graph(G, VUs, RSUs, HAP, rsu_index, profiler, own_rsu_only)
+
+    if rsu_index is None:
+        rsu_index = RSUCoverageIndex(RSUs)
+
+    if tracker is not None:
+        return update_graph_incremental(G, VUs, RSUs, HAP, tracker, rsu_index, profiler, changed_vus, own_rsu_only)
+
+    # Remove unnecessary edges first
+    edges_to_remove = [edge for edge in G.edges(data=True) if 'RSU' in edge[1] or edge[1] == 'HAP']
+    G.remove_edges_from(edges_to_remove)
+    profiler.count('edges_removed', len(edges_to_remove))
+
+    remaining = graph_vu_tasks(G, VUs)
+
+    # Look up each VU's RSU once rather than once per task and RSU
+    valid_rsus = {}
+    for vu_id, _, vu, _ in remaining:
+        if vu_id not in valid_rsus:
+            valid_rsus[vu_id] = find_valid_rsu(vu, RSUs, rsu_index)
+
+    profiler.count('edges_built', reconnect_tasks(G, remaining, valid_rsus, RSUs, own_rsu_only or covering_rsu_only(rsu_index)))
+    return G
+
+def update_graph_incremental(G, VUs, RSUs, HAP, tracker, rsu_index, profiler=NULL_PROFILER, changed_vus=None,
+                             own_rsu_only=False):
+    # Gives the same graph as a full update_graph, but only rebuilds the edges of tasks
+    # whose VU changed RSU or whose size, deadline or VU GFLOPS changed. When the caller
+    # already knows which VUs may have changed RSU (changed_vus), only those are checked.
+    vu_ids = changed_vus
+    if tracker['vu_tasks'] is None:
+        vu_ids = None
+        # First call: every task node is rebuilt, including ones that no longer match a task
+        profiler.count('edges_removed', G.number_of_edges())
+        G.remove_edges_from(list(G.edges()))
+        tracker['vu_tasks'] = {}
+        for vu_id, task_node, vu, task in graph_vu_tasks(G, VUs):
+            tracker['vu_tasks'].setdefault(vu_id, []).append((task_node, task))
+
+    vu_tasks = tracker['vu_tasks']
+    vu_rsus = tracker['vu_rsus']
+    task_signatures = tracker['task_signatures']
+
+    changed = []
+    valid_rsus = {}
+    for vu_id in list(vu_tasks) if vu_ids is None else [vu_id for vu_id in vu_ids if vu_id in vu_tasks]:
+        # Drop tasks that have been offloaded since the last update
+        tasks = [(task_node, task) for task_node, task in vu_tasks[vu_id] if task_node in G]
+        if not tasks:
+            del vu_tasks[vu_id]
+            continue
+        vu_tasks[vu_id] = tasks
+
+        vu = VUs[vu_id]
+        valid_rsu = find_valid_rsu(vu, RSUs, rsu_index)
+        rsu_id = valid_rsu['rsu_id'] if valid_rsu else None
+        rsu_changed = vu_id not in vu_rsus or vu_rsus[vu_id] != rsu_id
+        vu_rsus[vu_id] = rsu_id
+        valid_rsus[vu_id] = valid_rsu
+
+        for task_node, task in tasks:
+            signature = (task['size_MB'], task['max_latency_ms'], vu['GFLOPS'])
+            if rsu_changed or task_signatures.get(task_node) != signature:
+                task_signatures[task_node] = signature
+                changed.append((vu_id, task_node, vu, task))
+
+    edges_to_remove = [edge for _, task_node, _, _ in changed for edge in list(G.out_edges(task_node))]
+    G.remove_edges_from(edges_to_remove)
+    profiler.count('edges_removed', len(edges_to_remove))
+    profiler.count('edges_built', reconnect_tasks(G, changed, valid_rsus, RSUs, own_rsu_only or covering_rsu_only(rsu_index)))
+    profiler.count('tasks_rebuilt', len(changed))
     return G
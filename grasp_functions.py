@@ -0,0 +1,353 @@
+from model import *
+from graph_functions import *
+from simulation_functions import *
+from offloading_functions import *
+from instrumentation import NULL_PROFILER
+from concurrent.futures import ProcessPoolExecutor
+import os
+import time
+
+def grasp_round(graph, VUs, RSUs, HAP, alpha, rsu_index=None, tracker=None, improve=local_search, solver='grasp',
+                profiler=NULL_PROFILER, mobility=None, warm_start=None, ledger=None, remove_before_improve=False):
+    # One round: assign tasks, improve the assignment, move the VUs and update the graph.
+    # Returns (solution, decision_vector), or None when no task could be offloaded. Without an
+    # improvement step the decisions are those of the constructed solution. With a MobilityEventQueue only
+    # the VUs that crossed an RSU coverage boundary are re-checked when the graph is updated.
+    # With a warm_start, tasks whose edges did not change keep last round's construction pick and
+    # the improvement step starts each task on the server it left that VU's task on last round.
+    # Slots reserved in ledger during the round are released when it ends, the round's tasks have finished.
+    # Offloaded tasks leave the graph once the improvement step has run, remove_before_improve takes
+    # them out straight after construction as the original loop did, which leaves local search no moves.
+    if ledger is None:
+        ledger = CapacityLedger.from_servers(RSUs, HAP)
+    round_start = ledger.snapshot()
+    if solver == 'bottleneck':
+        with profiler.phase('bottleneck_assignment'):
+            solution, offloaded_any = solve_bottleneck_assignment(graph, RSUs, HAP, ledger)
+    else:
+        counts = {key: warm_start[key] for key in ('reused', 'redrawn', 'repaired')} if warm_start is not None else {}
+        with profiler.phase('generate_initial_solution'):
+            solution, offloaded_any = generate_initial_solution(graph, alpha, ledger, warm_start, remove_before_improve)
+        if warm_start is not None:
+            for key, before in counts.items():
+                profiler.count(f'warm_start_{key}', warm_start[key] - before)
+    if not offloaded_any:
+        print("No more tasks can be offloaded due to capacity limits.")
+        profiler.count('capacity_stops')
+        return None
+
+    decision_vector = {task_node: get_offloading_option(target) for task_node, (target, _) in solution.items()}
+    if improve is not None and solver != 'bottleneck':
+        seeded = seed_from_warm_start(solution, graph, warm_start, ledger) if warm_start is not None else {}
+        with profiler.phase('local_search'):
+            solution, decision_vector = improve(solution, graph, VUs, RSUs, HAP, profiler=profiler, ledger=ledger)
+        if warm_start is not None:
+            # A seeded task the improvement step left where it was is a move it did not have to make
+            profiler.count('warm_start_seeded', len(seeded))
+            profiler.count('local_search_moves_avoided',
+                           sum(1 for task_node, target in seeded.items() if solution[task_node][0] == target))
+            record_placements(solution, graph, warm_start)
+    if solver != 'bottleneck' and not remove_before_improve:
+        remove_graph_tasks(graph, list(solution))
+    changed_vus = None
+    with profiler.phase('update_vehicle_positions'):
+        if mobility is not None:
+            changed_vus = mobility.advance(504.5 / 1000)
+            profiler.count('rsu_handovers', len(changed_vus))
+        else:
+            update_vehicle_positions(VUs, 504.5 / 1000)
+    with profiler.phase('update_graph'):
+        update_graph(graph, VUs, RSUs, HAP, rsu_index, tracker, profiler, changed_vus)
+    if warm_start is not None:
+        warm_start['full'] = {server for server in ledger.servers if not ledger.has_capacity(server)}
+    ledger.rollback(round_start)
+    return solution, decision_vector
+
+def start_run(VUs, RSUs, HAP, initial_vu_states, rsu_index=None, profiler=NULL_PROFILER, template=None):
+    # Reset the VUs and get a fresh graph for a run, cloned from template when there is one
+    reset_vus_to_initial_state(VUs, initial_vu_states)
+    if template is not None:
+        with profiler.phase('clone_offloading_graph'):
+            graph = clone_offloading_graph(template)
+    else:
+        with profiler.phase('create_offloading_graph'):
+            graph = create_offloading_graph(VUs, RSUs, HAP, rsu_index)
+        profiler.count('edges_built', graph.number_of_edges())
+    profiler.end_setup()
+    return graph
+
+def run_grasp(VUs, RSUs, HAP, initial_vu_states, alpha, rsu_index=None, use_local_search=True, incremental=False,
+              local_search_strategy='rescan', profiler=NULL_PROFILER, template=None, solver='grasp',
+              event_mobility=False, warm_start=False, ledger=None, remove_before_improve=False):
+    # One GRASP run from the initial VU state, returns its total latency, decisions and per-round latencies.
+    # template is a graph already built from the initial state, cloned instead of building a new one.
+    # solver='bottleneck' replaces construction and local search with the exact per-round assignment.
+    # event_mobility schedules RSU boundary crossings analytically and implies incremental updates.
+    # warm_start carries each task's construction pick and RCL over to the next round while its edges are unchanged.
+    # ledger holds server slots already in use, it is rolled back to its starting state when the run ends.
+    # remove_before_improve with the 'rescan' strategy reproduces the results of the original loop.
+    if ledger is None:
+        ledger = CapacityLedger.from_servers(RSUs, HAP)
+    run_start = ledger.snapshot()
+    graph = start_run(VUs, RSUs, HAP, initial_vu_states, rsu_index, profiler, template)
+    tracker = create_graph_tracker() if incremental or event_mobility else None  # Only rebuild edges of VUs that changed RSU
+    mobility = MobilityEventQueue(VUs, RSUs, rsu_index) if event_mobility else None
+    warm = create_warm_start() if warm_start else None
+    improve = get_improvement_step(local_search_strategy) if use_local_search else None
+    total_max_latency = 0
+    final_decision_vector = {}
+    round_latencies = []
+
+    while graph.number_of_edges() > 0:
+        with profiler.phase('round'):
+            result = grasp_round(graph, VUs, RSUs, HAP, alpha, rsu_index, tracker, improve, solver, profiler, mobility, warm,
+                                 ledger, remove_before_improve)
+        if result is None:
+            break
+        solution, decision_vector = result
+
+        final_decision_vector.update(decision_vector)  # Combine current decisions
+
+        max_latency_this_loop = max((data[1] for data in solution.values()), default=0)
+        round_latencies.append(max_latency_this_loop)
+        total_max_latency += max_latency_this_loop
+        profiler.count('tasks_offloaded', len(solution))
+        profiler.end_round(max_latency=max_latency_this_loop)
+
+    ledger.rollback(run_start)
+    profiler.end_run(alpha=alpha, total_latency=total_max_latency)
+    return total_max_latency, final_decision_vector, round_latencies
+
+def get_improvement_step(improvement):
+    # Improvement steps by name, local_search strategies plus the cheaper metaheuristics
+    if callable(improvement):
+        return improvement
+    steps = {
+        'rescan': local_search,
+        'queue': local_search_queue,
+        'annealing': simulated_annealing,
+        'tabu': tabu_search
+    }
+    if improvement not in steps:
+        raise ValueError(f"Unknown improvement step: {improvement}")
+    return steps[improvement]
+
+def anytime_grasp(VUs, RSUs, HAP, initial_vu_states, alpha, time_budget_s, improvement='rescan', rsu_index=None,
+                  profiler=NULL_PROFILER):
+    # Keeps starting GRASP runs until time_budget_s seconds have passed and returns the best
+    # decisions found so far. The deadline is checked between rounds, so a run can be cut short;
+    # its decisions are only returned if no run finished at all.
+    improve = get_improvement_step(improvement)
+    start = time.perf_counter()
+    deadline = start + time_budget_s
+    template = create_graph_template(VUs, RSUs, HAP, initial_vu_states, rsu_index, profiler=profiler)
+    total_tasks = sum(len(vu['tasks']) for vu in VUs.values())
+    ledger = CapacityLedger.from_servers(RSUs, HAP)
+
+    best_latency = float('inf')
+    best_decision_vector = {}
+    runs_completed = 0
+    rounds = 0
+    partial = None  # (tasks decided, latency, decisions) of the run the deadline interrupted
+
+    while time.perf_counter() < deadline:
+        graph = start_run(VUs, RSUs, HAP, initial_vu_states, rsu_index, profiler, template)
+        total_max_latency = 0
+        final_decision_vector = {}
+        completed = True
+
+        while graph.number_of_edges() > 0:
+            if time.perf_counter() >= deadline:
+                completed = False
+                break
+            with profiler.phase('round'):
+                result = grasp_round(graph, VUs, RSUs, HAP, alpha, rsu_index, None, improve, profiler=profiler,
+                                     ledger=ledger)
+            if result is None:
+                break
+            solution, decision_vector = result
+            final_decision_vector.update(decision_vector)
+            max_latency_this_loop = max((data[1] for data in solution.values()), default=0)
+            total_max_latency += max_latency_this_loop
+            rounds += 1
+            profiler.count('tasks_offloaded', len(solution))
+            profiler.end_round(max_latency=max_latency_this_loop)
+
+        profiler.end_run(alpha=alpha, total_latency=total_max_latency, completed=completed)
+        if completed:
+            runs_completed += 1
+            if total_max_latency < best_latency:
+                best_latency = total_max_latency
+                best_decision_vector = final_decision_vector.copy()
+        else:
+            partial = (len(final_decision_vector), total_max_latency, final_decision_vector)
+
+    if runs_completed == 0 and partial is not None:
+        best_latency = partial[1]
+        best_decision_vector = partial[2]
+
+    return {
+        'best_latency': best_latency,
+        'best_decision_vector': best_decision_vector,
+        'complete': runs_completed > 0,  # False when the decisions only cover part of the tasks
+        'runs_completed': runs_completed,
+        'rounds': rounds,
+        'interrupted_run_tasks_decided': partial[0] if partial is not None else None,
+        'total_tasks': total_tasks,
+        'elapsed_s': time.perf_counter() - start
+    }
+
+def create_graph_template(VUs, RSUs, HAP, initial_vu_states, rsu_index=None, compact=False, profiler=NULL_PROFILER):
+    # The initial graph is the same for every run of a scenario, so it is built once and cloned
+    reset_vus_to_initial_state(VUs, initial_vu_states)
+    with profiler.phase('create_offloading_graph'):
+        if compact:
+            template = create_compact_offloading_graph(VUs, RSUs, HAP, rsu_index)
+        else:
+            template = create_offloading_graph(VUs, RSUs, HAP, rsu_index)
+    profiler.count('edges_built', template.number_of_edges())
+    return template
+
+def best_of_runs(VUs, RSUs, HAP, initial_vu_states, alpha, number_of_runs, rsu_index=None, use_local_search=True,
+                 incremental=False, local_search_strategy='rescan', profiler=NULL_PROFILER, compact=False, template=None,
+                 warm_start=False, remove_before_improve=False):
+    # template can be passed in by callers that keep one across calls for an unchanged scenario
+    best_latency = float('inf')
+    best_decision_vector = {}
+    best_round_latencies = []
+    if template is None:
+        template = create_graph_template(VUs, RSUs, HAP, initial_vu_states, rsu_index, compact, profiler)
+    ledger = CapacityLedger.from_servers(RSUs, HAP)  # Every run starts from the same server load
+    profiler.end_setup()
+    for _ in range(number_of_runs):
+        total_max_latency, final_decision_vector, round_latencies = run_grasp(
+            VUs, RSUs, HAP, initial_vu_states, alpha, rsu_index, use_local_search, incremental, local_search_strategy,
+            profiler, template, warm_start=warm_start, ledger=ledger, remove_before_improve=remove_before_improve)
+
+        # Check if the current run has the best latency and update accordingly
+        if total_max_latency < best_latency:
+            best_latency = total_max_latency
+            best_decision_vector = final_decision_vector.copy()
+            best_round_latencies = round_latencies
+
+    return best_latency, best_decision_vector, best_round_latencies
+
+def reactive_grasp(VUs, RSUs, HAP, initial_vu_states, alpha_values=None, max_runs=900, patience=100, time_budget_s=None,
+                   block_size=10, amplification=10, rsu_index=None, profiler=NULL_PROFILER):
+    # Reactive GRASP: each run draws alpha from alpha_values, and every block_size runs the
+    # probabilities are reset to q_i = (best latency / mean latency of alpha i) ** amplification,
+    # normalised. Stops after max_runs, after patience runs without a new best, or once
+    # time_budget_s seconds have passed.
+    if alpha_values is None:
+        alpha_values = [0.1 * i for i in range(1, 10)]  # Same grid as find_alpha
+    probabilities = [1 / len(alpha_values)] * len(alpha_values)
+    latency_sums = [0.0] * len(alpha_values)
+    run_counts = [0] * len(alpha_values)
+
+    best_latency = float('inf')
+    best_alpha = None
+    best_decision_vector = {}
+    runs = 0
+    runs_without_improvement = 0
+    stop_reason = 'max_runs'
+
+    template = create_graph_template(VUs, RSUs, HAP, initial_vu_states, rsu_index, profiler=profiler)
+    profiler.end_setup()
+    start = time.perf_counter()
+
+    while runs < max_runs:
+        if runs_without_improvement >= patience:
+            stop_reason = 'patience'
+            break
+        if time_budget_s is not None and time.perf_counter() - start >= time_budget_s:
+            stop_reason = 'time_budget'
+            break
+
+        i = random.choices(range(len(alpha_values)), weights=probabilities)[0]
+        total_max_latency, final_decision_vector, _ = run_grasp(
+            VUs, RSUs, HAP, initial_vu_states, alpha_values[i], rsu_index, profiler=profiler, template=template)
+        runs += 1
+        latency_sums[i] += total_max_latency
+        run_counts[i] += 1
+
+        if total_max_latency < best_latency:
+            best_latency = total_max_latency
+            best_alpha = alpha_values[i]
+            best_decision_vector = final_decision_vector.copy()
+            runs_without_improvement = 0
+        else:
+            runs_without_improvement += 1
+
+        if runs % block_size == 0:
+            # Alphas not tried yet keep the highest weight so they still get explored
+            weights = []
+            for latency_sum, count in zip(latency_sums, run_counts):
+                mean_latency = latency_sum / count if count else 0
+                weights.append((best_latency / mean_latency) ** amplification if mean_latency > 0 else 1.0)
+            total_weight = sum(weights)
+            probabilities = [weight / total_weight for weight in weights]
+
+    return {
+        'best_alpha': best_alpha,
+        'best_latency': best_latency,
+        'best_decision_vector': best_decision_vector,
+        'runs': runs,
+        'stop_reason': stop_reason,
+        'elapsed_s': time.perf_counter() - start,
+        'alpha_probabilities': dict(zip(alpha_values, probabilities)),
+        'alpha_runs': dict(zip(alpha_values, run_counts))
+    }
+
+# Scenario shared by every job in a worker process, set once by the pool initialiser
+_worker_scenario = None
+
+def _init_worker(VUs, RSUs, HAP, use_local_search):
+    global _worker_scenario
+    initial_vu_states = store_initial_vu_states(VUs)
+    rsu_index = RSUCoverageIndex(RSUs)
+    template = create_graph_template(VUs, RSUs, HAP, initial_vu_states, rsu_index)
+    _worker_scenario = (VUs, RSUs, HAP, initial_vu_states, rsu_index, use_local_search, template)
+
+def _run_job(job):
+    alpha, seed = job
+    VUs, RSUs, HAP, initial_vu_states, rsu_index, use_local_search, template = _worker_scenario
+    random.seed(seed)
+    total_max_latency, final_decision_vector, _ = run_grasp(
+        VUs, RSUs, HAP, initial_vu_states, alpha, rsu_index, use_local_search, template=template)
+    return total_max_latency, final_decision_vector
+
+def job_seed(base_seed, alpha_index, run):
+    # Derived from the job's position only, so results do not depend on the worker count
+    return random.Random(f"{base_seed}:{alpha_index}:{run}").getrandbits(64)
+
+def run_grasp_jobs(VUs, RSUs, HAP, alpha_values, number_of_runs, workers=None, base_seed=0, use_local_search=True):
+    # Spread every (alpha, run) pair over a process pool, returns {alpha: (best_latency, best_decision_vector)}
+    jobs = [(alpha, job_seed(base_seed, alpha_index, run))
+            for alpha_index, alpha in enumerate(alpha_values) for run in range(number_of_runs)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        # Same jobs in this process. The jobs reseed the module-level generator and move the VUs,
+        # so both are put back afterwards, as if the jobs had run in a worker process.
+        global _worker_scenario
+        initial_vu_states = store_initial_vu_states(VUs)
+        random_state = random.getstate()
+        try:
+            _init_worker(VUs, RSUs, HAP, use_local_search)
+            outputs = list(map(_run_job, jobs))
+        finally:
+            _worker_scenario = None
+            random.setstate(random_state)
+            reset_vus_to_initial_state(VUs, initial_vu_states)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(VUs, RSUs, HAP, use_local_search)) as executor:
+            chunksize = max(1, len(jobs) // (4 * workers))
+            outputs = list(executor.map(_run_job, jobs, chunksize=chunksize))
+
+    # Reduce in job order so ties resolve the same way as the serial loop
+    results = {alpha: (float('inf'), {}) for alpha in alpha_values}
+    for (alpha, _), (total_max_latency, final_decision_vector) in zip(jobs, outputs):
+        if total_max_latency < results[alpha][0]:
+            results[alpha] = (total_max_latency, final_decision_vector)
+    return results
@@ -0,0 +1,152 @@
+import json
+import logging
+import time
+
+class NullSink:
+    # Drops every record, for when only the totals from Profiler.summary are needed
+    def emit(self, record):
+        pass
+
+    def close(self):
+        pass
+
+class MemorySink:
+    # Keeps every record in a list, handy for tests and notebooks
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def close(self):
+        pass
+
+class JsonlSink:
+    # Appends one JSON object per line to a file
+    def __init__(self, path):
+        self.file = open(path, 'a')
+
+    def emit(self, record):
+        self.file.write(json.dumps(record) + '\n')
+
+    def close(self):
+        self.file.close()
+
+class LoggingSink:
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger('vehicular_edge_computing.profiler')
+        self.level = level
+
+    def emit(self, record):
+        self.logger.log(self.level, json.dumps(record))
+
+    def close(self):
+        pass
+
+class _PhaseTimer:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+class Profiler:
+    # Collects phase wall times and counters for each round, emits one record per round
+    # and per run to the sink, and keeps running totals across runs
+    def __init__(self, sink=None):
+        self.sink = sink if sink is not None else MemorySink()
+        self.run_index = 0
+        self.round_index = 0
+        self.round_times, self.round_counters = {}, {}
+        self.run_times, self.run_counters = {}, {}
+        self.total_times, self.total_counters = {}, {}
+        self.runs = 0
+
+    def phase(self, name):
+        return _PhaseTimer(self, name)
+
+    def add_time(self, name, seconds):
+        self.round_times[name] = self.round_times.get(name, 0.0) + seconds
+
+    def count(self, name, amount=1):
+        self.round_counters[name] = self.round_counters.get(name, 0) + amount
+
+    def end_setup(self):
+        # Work done before the first round, such as building the graph, only counts towards the run
+        self._merge_round()
+
+    def end_round(self, **info):
+        self.sink.emit({'event': 'round', 'run': self.run_index, 'round': self.round_index,
+                        'phase_time_s': self.round_times, 'counters': self.round_counters, **info})
+        self.round_index += 1
+        self._merge_round()
+
+    def end_run(self, **info):
+        # Anything recorded after the last completed round is folded into the run totals
+        self._merge_round()
+        self.sink.emit({'event': 'run', 'run': self.run_index, 'rounds': self.round_index,
+                        'phase_time_s': self.run_times, 'counters': self.run_counters, **info})
+        _merge(self.total_times, self.run_times)
+        _merge(self.total_counters, self.run_counters)
+        self.run_times, self.run_counters = {}, {}
+        self.runs += 1
+        self.run_index += 1
+        self.round_index = 0
+
+    def _merge_round(self):
+        _merge(self.run_times, self.round_times)
+        _merge(self.run_counters, self.round_counters)
+        self.round_times, self.round_counters = {}, {}
+
+    def summary(self):
+        return {'runs': self.runs, 'phase_time_s': dict(self.total_times), 'counters': dict(self.total_counters)}
+
+    def close(self):
+        self.sink.close()
+
+def _merge(totals, values):
+    for name, value in values.items():
+        totals[name] = totals.get(name, 0) + value
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+class NullProfiler:
+    # Stand-in used when profiling is off, every call is a no-op
+    _phase = _NullPhase()
+
+    def phase(self, name):
+        return self._phase
+
+    def add_time(self, name, seconds):
+        pass
+
+    def count(self, name, amount=1):
+        pass
+
+    def end_setup(self):
+        pass
+
+    def end_round(self, **info):
+        pass
+
+    def end_run(self, **info):
+        pass
+
+    def summary(self):
+        return {'runs': 0, 'phase_time_s': {}, 'counters': {}}
+
+    def close(self):
+        pass
+
+NULL_PROFILER = NullProfiler()
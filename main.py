@@ -2,11 +2,17 @@ from model import *
 from graph_functions import *
 from simulation_functions import *
 from offloading_functions import *
+from grasp_functions import *
+from streaming_functions import *
+from monte_carlo_functions import *
+from road_network import *
+from instrumentation import Profiler, NullSink
 
-def find_alpha():
+def find_alpha(workers=1, seed=None, profiler=NULL_PROFILER):
     VUs = initialise_VUs()
     RSUs = initialise_RSUs()
     HAP = initialise_HAP()
+    rsu_index = RSUCoverageIndex(RSUs)
     initial_vu_states = store_initial_vu_states(VUs)
 
     alpha_values = [0.1 * i for i in range(1, 10)]  # Generates [0.1, 0.2, ..., 0.9]
@@ -17,38 +23,19 @@ def find_alpha():
     lowest_overall_latency = float('inf')
     overall_best_decision_vector = {}
 
-    for alpha in alpha_values:
-        best_latency = float('inf')
-        best_decision_vector = {}
-        for _ in range(number_of_runs):
-            reset_vus_to_initial_state(VUs, initial_vu_states)
-            graph = create_offloading_graph(VUs, RSUs, HAP)
-            total_max_latency = 0
-            final_decision_vector = {}
-
-            while graph.number_of_edges() > 0:
-                solution, offloaded_any = generate_initial_solution(graph, alpha)
-                if not offloaded_any:
-                    print("No more tasks can be offloaded due to capacity limits.")
-                    break
-
-                solution, decision_vector = local_search(solution, graph, VUs, RSUs, HAP)
-                update_vehicle_positions(VUs, 504.5 / 1000)
-                update_graph(graph, VUs, RSUs, HAP)
-
-                final_decision_vector.update(decision_vector)  # Combine current decisions
-
-                max_latency_this_loop = max((data[1] for data in solution.values()), default=0)
-                total_max_latency += max_latency_this_loop
+    if workers != 1 or seed is not None:
+        # Parallel mode, each (alpha, run) job gets its own seed derived from the base seed.
+        # Runs in worker processes are not reported to the profiler.
+        results = run_grasp_jobs(VUs, RSUs, HAP, alpha_values, number_of_runs, workers, seed or 0)
+    else:
+        for alpha in alpha_values:
+            best_latency, best_decision_vector, _ = best_of_runs(
+                VUs, RSUs, HAP, initial_vu_states, alpha, number_of_runs, rsu_index, profiler=profiler)
 
-            # Check if the current run has the best latency and update accordingly
-            if total_max_latency < best_latency:
-                best_latency = total_max_latency
-                best_decision_vector = final_decision_vector.copy()
-
-        # Store the best latency and its corresponding decision vector for this alpha
-        results[alpha] = (best_latency, best_decision_vector)
+            # Store the best latency and its corresponding decision vector for this alpha
+            results[alpha] = (best_latency, best_decision_vector)
 
+    for alpha, (best_latency, best_decision_vector) in results.items():
         # Update the overall best alpha if the current one has lower latency
         if best_latency < lowest_overall_latency:
             lowest_overall_latency = best_latency
@@ -66,54 +53,48 @@ def find_alpha():
 
     return overall_best_alpha
 
-def main():
+def find_alpha_reactive(max_runs=900, patience=100, time_budget_s=None, profiler=NULL_PROFILER):
+    # Adaptive alternative to find_alpha, spends runs on the alphas that have been doing well
     VUs = initialise_VUs()
     RSUs = initialise_RSUs()
     HAP = initialise_HAP()
+    rsu_index = RSUCoverageIndex(RSUs)
     initial_vu_states = store_initial_vu_states(VUs)
 
-    alpha_values = [0.498]
-    results = {}
-    number_of_runs = 100
+    result = reactive_grasp(VUs, RSUs, HAP, initial_vu_states, max_runs=max_runs, patience=patience,
+                            time_budget_s=time_budget_s, rsu_index=rsu_index, profiler=profiler)
 
-    lowest_overall_latency = float('inf')
-    overall_best_decision_vector = {}
-
-    for alpha in alpha_values:
-        best_latency = float('inf')
-        best_decision_vector = {}
-        for _ in range(number_of_runs):
-            reset_vus_to_initial_state(VUs, initial_vu_states)
-            graph = create_offloading_graph(VUs, RSUs, HAP)
-            total_max_latency = 0
-            final_decision_vector = {}
+    print(f"Reactive GRASP stopped after {result['runs']} runs ({result['stop_reason']}).")
+    if result['best_alpha'] is None:
+        # patience=0, max_runs=0 or a budget that ran out before the first run finished
+        print("No run finished, so there is no optimal alpha.")
+        return None
 
-            while graph.number_of_edges() > 0:
-                solution, offloaded_any = generate_initial_solution(graph, alpha)
-                if not offloaded_any:
-                    print("No more tasks can be offloaded due to capacity limits.")
-                    break
+    optimal_decision_string = format_decision_vector(result['best_decision_vector'])
+    print(f"The most optimal alpha is {result['best_alpha']:.1f} with the lowest latency of {result['best_latency']:.4f}ms. Optimal Decisions: {optimal_decision_string}")
 
-                solution, decision_vector = local_search(solution, graph, VUs, RSUs, HAP)
-                update_vehicle_positions(VUs, 504.5 / 1000)
-                update_graph(graph, VUs, RSUs, HAP)
+    return result['best_alpha']
 
-                final_decision_vector.update(decision_vector)  # Combine current decisions
-
-                max_latency_this_loop = max((data[1] for data in solution.values()), default=0)
-                total_max_latency += max_latency_this_loop
+def main(workers=1, seed=None, profiler=NULL_PROFILER):
+    VUs = initialise_VUs()
+    RSUs = initialise_RSUs()
+    HAP = initialise_HAP()
+    rsu_index = RSUCoverageIndex(RSUs)
+    initial_vu_states = store_initial_vu_states(VUs)
 
-            # Check if the current run has the best latency and update accordingly
-            if total_max_latency < best_latency:
-                best_latency = total_max_latency
-                best_decision_vector = final_decision_vector.copy()
+    alpha_values = [0.498]
+    results = {}
+    number_of_runs = 100
 
-        # Store the best latency and its corresponding decision vector for this alpha
-        results[alpha] = (best_latency, best_decision_vector)
+    if workers != 1 or seed is not None:
+        results = run_grasp_jobs(VUs, RSUs, HAP, alpha_values, number_of_runs, workers, seed or 0)
+    else:
+        for alpha in alpha_values:
+            best_latency, best_decision_vector, _ = best_of_runs(
+                VUs, RSUs, HAP, initial_vu_states, alpha, number_of_runs, rsu_index, profiler=profiler)
 
-        if best_latency < lowest_overall_latency:
-            lowest_overall_latency = best_latency
-            overall_best_decision_vector = best_decision_vector.copy()
+            # Store the best latency and its corresponding decision vector for this alpha
+            results[alpha] = (best_latency, best_decision_vector)
 
     # Print the best results for each alpha
     for alpha, (latency, decision_vector) in results.items():
@@ -122,107 +103,141 @@ def main():
 
     return decision_string
 
-def test():
+def anytime(time_budget_s=504.5 / 1000, improvement='rescan', profiler=NULL_PROFILER):
+    # Same scenario as main() but bounded by a wall-clock budget instead of a fixed 100 runs
     VUs = initialise_VUs()
     RSUs = initialise_RSUs()
     HAP = initialise_HAP()
+    rsu_index = RSUCoverageIndex(RSUs)
     initial_vu_states = store_initial_vu_states(VUs)
 
-    alpha_values = [0.498]
-    results = {}
-    number_of_runs = 100
-
-    lowest_overall_latency = float('inf')
-    overall_best_decision_vector = {}
+    result = anytime_grasp(VUs, RSUs, HAP, initial_vu_states, 0.498, time_budget_s, improvement, rsu_index, profiler)
 
-    for alpha in alpha_values:
-        best_latency = float('inf')
-        best_decision_vector = {}
-        for _ in range(number_of_runs):
-            reset_vus_to_initial_state(VUs, initial_vu_states)
-            graph = create_offloading_graph(VUs, RSUs, HAP)
-            total_max_latency = 0
-            final_decision_vector = {}
-
-            while graph.number_of_edges() > 0:
-                solution, offloaded_any = generate_initial_solution(graph, alpha)
-                if not offloaded_any:
-                    print("No more tasks can be offloaded due to capacity limits.")
-                    break
+    decision_string = format_decision_vector(result['best_decision_vector'])
+    status = 'complete' if result['complete'] else f"partial, {len(result['best_decision_vector'])}/{result['total_tasks']} tasks"
+    print(f"{result['runs_completed']} runs in {result['elapsed_s'] * 1000:.1f}ms ({status}) - Best Latency: {result['best_latency']:.4f}, Best Decisions: {decision_string}")
 
-                solution, decision_vector = local_search(solution, graph, VUs, RSUs, HAP)
-                update_vehicle_positions(VUs, 504.5 / 1000)
-                update_graph(graph, VUs, RSUs, HAP)
+    return decision_string
 
-                final_decision_vector.update(decision_vector)  # Combine current decisions
+def stream(rate_per_s=1.0, duration_s=60.0, alpha=0.498, profiler=NULL_PROFILER):
+    # Online mode, every VU generates tasks as a Poisson process instead of starting with a fixed batch
+    VUs = initialise_VUs()
+    RSUs = initialise_RSUs()
+    HAP = initialise_HAP()
+    rsu_index = RSUCoverageIndex(RSUs)
 
-                max_latency_this_loop = max((data[1] for data in solution.values()), default=0)
-                total_max_latency += max_latency_this_loop
+    arrivals = poisson_arrivals(VUs, rate_per_s, duration_s)
+    result = stream_grasp(VUs, RSUs, HAP, arrivals, alpha, rsu_index=rsu_index, profiler=profiler)
 
-            # Check if the current run has the best latency and update accordingly
-            if total_max_latency < best_latency:
-                best_latency = total_max_latency
-                best_decision_vector = final_decision_vector.copy()
+    print(f"{result['tasks_scheduled']}/{result['tasks_arrived']} tasks offloaded in {result['batches']} batches, "
+          f"{result['deadline_misses']} deadline misses ({result['deadline_miss_rate']:.1%}), "
+          f"mean response {result['mean_response_ms']:.1f}ms, {result['throughput_tasks_per_s']:.0f} tasks/s")
 
-        # Store the best latency and its corresponding decision vector for this alpha
-        results[alpha] = (best_latency, best_decision_vector)
+    return result
 
-        if best_latency < lowest_overall_latency:
-            lowest_overall_latency = best_latency
-            overall_best_decision_vector = best_decision_vector.copy()
+def city(rows=10, cols=10, block_length=150.0, rsu_spacing=50.0, profiler=NULL_PROFILER):
+    # Same as test() on a grid of two-way roads, VUs turn at random at each intersection
+    network = grid_road_network(rows, cols, block_length)
+    VUs = initialise_road_VUs(network)
+    RSUs = initialise_road_RSUs(network, rsu_spacing)
+    HAP = initialise_HAP()
+    rsu_index = GridRSUIndex(RSUs, network)
+    initial_vu_states = store_initial_vu_states(VUs)
 
-    return lowest_overall_latency
+    best_latency, _, _ = best_of_runs(VUs, RSUs, HAP, initial_vu_states, 0.498, 100, rsu_index, profiler=profiler)
+    return best_latency
 
-def basic():
+def test(profiler=NULL_PROFILER):
     VUs = initialise_VUs()
     RSUs = initialise_RSUs()
     HAP = initialise_HAP()
+    rsu_index = RSUCoverageIndex(RSUs)
     initial_vu_states = store_initial_vu_states(VUs)
 
     alpha_values = [0.498]
-    results = {}
     number_of_runs = 100
 
     lowest_overall_latency = float('inf')
-    overall_best_decision_vector = {}
 
     for alpha in alpha_values:
-        best_latency = float('inf')
-        best_decision_vector = {}
-        for _ in range(number_of_runs):
-            reset_vus_to_initial_state(VUs, initial_vu_states)
-            graph = create_offloading_graph(VUs, RSUs, HAP)
-            total_max_latency = 0
-            final_decision_vector = {}
+        best_latency, _, _ = best_of_runs(VUs, RSUs, HAP, initial_vu_states, alpha, number_of_runs, rsu_index,
+                                          profiler=profiler)
+        lowest_overall_latency = min(lowest_overall_latency, best_latency)
+
+    return lowest_overall_latency
+
+def basic(profiler=NULL_PROFILER):
+    VUs = initialise_VUs()
+    RSUs = initialise_RSUs()
+    HAP = initialise_HAP()
+    rsu_index = RSUCoverageIndex(RSUs)
+    initial_vu_states = store_initial_vu_states(VUs)
 
-            while graph.number_of_edges() > 0:
-                solution, offloaded_any = generate_initial_solution(graph, alpha)
-                if not offloaded_any:
-                    print("No more tasks can be offloaded due to capacity limits.")
-                    break
+    alpha_values = [0.498]
+    number_of_runs = 100
 
-                # solution, decision_vector = local_search(solution, graph, VUs, RSUs, HAP)
-                update_vehicle_positions(VUs, 504.5 / 1000)
-                update_graph(graph, VUs, RSUs, HAP)
+    lowest_overall_latency = float('inf')
 
-                #final_decision_vector.update(decision_vector)  # Combine current decisions
+    for alpha in alpha_values:
+        # Construction only, local search is skipped
+        best_latency, _, _ = best_of_runs(VUs, RSUs, HAP, initial_vu_states, alpha, number_of_runs, rsu_index,
+                                          use_local_search=False, profiler=profiler)
+        lowest_overall_latency = min(lowest_overall_latency, best_latency)
 
-                max_latency_this_loop = max((data[1] for data in solution.values()), default=0)
-                total_max_latency += max_latency_this_loop
+    return lowest_overall_latency
 
-            # Check if the current run has the best latency and update accordingly
-            if total_max_latency < best_latency:
-                best_latency = total_max_latency
-                best_decision_vector = final_decision_vector.copy()
+def bottleneck(profiler=NULL_PROFILER):
+    # Exact min-max assignment every round, a baseline for test() and basic().
+    # It has no randomness, so a single run is enough.
+    VUs = initialise_VUs()
+    RSUs = initialise_RSUs()
+    HAP = initialise_HAP()
+    rsu_index = RSUCoverageIndex(RSUs)
+    initial_vu_states = store_initial_vu_states(VUs)
 
-        # Store the best latency and its corresponding decision vector for this alpha
-        results[alpha] = (best_latency, best_decision_vector)
+    total_max_latency, _, _ = run_grasp(VUs, RSUs, HAP, initial_vu_states, None, rsu_index, profiler=profiler,
+                                        solver='bottleneck')
+    return total_max_latency
 
-        if best_latency < lowest_overall_latency:
-            lowest_overall_latency = best_latency
-            overall_best_decision_vector = best_decision_vector.copy()
+def check_improvement_steps(alpha=0.9, number_of_runs=10):
+    # Every improvement step has to move at least one task, otherwise offloaded tasks are leaving
+    # the graph before the step can see their edges. A wide RCL leaves room for improving moves.
+    VUs = initialise_VUs()
+    RSUs = initialise_RSUs()
+    HAP = initialise_HAP()
+    rsu_index = RSUCoverageIndex(RSUs)
+    initial_vu_states = store_initial_vu_states(VUs)
 
-    return lowest_overall_latency
+    moves = {}
+    for improvement in ('rescan', 'queue', 'annealing', 'tabu'):
+        profiler = Profiler(NullSink())
+        best_of_runs(VUs, RSUs, HAP, initial_vu_states, alpha, number_of_runs, rsu_index,
+                     local_search_strategy=improvement, profiler=profiler)
+        moves[improvement] = profiler.summary()['counters'].get('local_search_moves', 0)
+        print(f"{improvement}: {moves[improvement]} moves over {number_of_runs} runs")
+
+    stuck = [improvement for improvement, count in moves.items() if count == 0]
+    if stuck:
+        raise RuntimeError(f"Improvement steps made no moves: {stuck}")
+    return moves
+
+def estimate_latency(method='grasp', relative_width=0.01, max_replications=1000, seed=0):
+    # Replaces looping test() or basic() 1000 times, stops once the 95% interval on the mean
+    # latency is within relative_width of the mean
+    result = sequential_replications(method_replicate(method), relative_width=relative_width,
+                                     max_replications=max_replications, base_seed=seed)
+    print(f"{method}: mean latency {result['mean']:.4f}ms, 95% CI [{result['ci_low']:.4f}, {result['ci_high']:.4f}] "
+          f"after {result['count']} replications ({result['stop_reason']})")
+    return result
+
+def compare(method_a='basic', method_b='grasp', relative_width=0.05, max_replications=1000, seed=0):
+    # Paired comparison on common random numbers, both methods solve the same scenarios
+    result = paired_replications(method_replicate(method_a), method_replicate(method_b), relative_width=relative_width,
+                                 max_replications=max_replications, base_seed=seed)
+    difference = result['difference']
+    print(f"{method_a} - {method_b}: {difference['mean']:.4f}ms, 95% CI [{difference['ci_low']:.4f}, {difference['ci_high']:.4f}] "
+          f"after {difference['count']} paired replications ({result['stop_reason']})")
+    return result
 
 # Find optimal alpha
 # if __name__ == "__main__":
@@ -1,4 +1,5 @@
 import random
+import sys
 
 # Define constants
 VU_m = 10  # Number of Vehicle Users (VUs)
@@ -33,8 +34,7 @@ def initialise_RSUs():
         'GFLOPS': RSU_GFLOPS,
         'position': (i + 1) * (l / (RSU_n + 1)), # Spread the RSUs equally across the road
         'coverage': RSU_coverage,
-        'max_tasks': 10,
-        'task_count': 0
+        'max_tasks': 10
     } for i in range(RSU_n)}
     return RSUs
 
@@ -42,6 +42,22 @@ def initialise_HAP():
     return {
         'GFLOPS': HAP_GFLOPS,
         'coverage': l,
-        'max_tasks': 5,
-        'task_count': 0
+        'max_tasks': 5
     }
+
+# Constants a scenario may override, see apply_scenario
+SCENARIO_CONSTANTS = ('VU_m', 'RSU_n', 'l', 'VU_speed', 'VU_GFLOPS', 'RSU_GFLOPS', 'RSU_coverage', 'HAP_GFLOPS', 'max_tasks_per_VU')
+
+def apply_scenario(**constants):
+    # Other modules copy these constants with `from model import *`, so every copy is updated.
+    # Returns the previous values so the caller can restore them.
+    unknown = set(constants) - set(SCENARIO_CONSTANTS)
+    if unknown:
+        raise ValueError(f"Unknown scenario constants: {sorted(unknown)}")
+
+    previous = {name: globals()[name] for name in constants}
+    for module in list(sys.modules.values()):
+        if getattr(module, 'initialise_VUs', None) is initialise_VUs:
+            for name, value in constants.items():
+                setattr(module, name, value)
+    return previous
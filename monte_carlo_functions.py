@@ -0,0 +1,96 @@
+from statistics import NormalDist
+import math
+import time
+from experiment_runner import run_replication, replication_seed
+
+class RunningStats:
+    # Welford's running mean and variance, one pass and numerically stable
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # Sum of squared deviations from the running mean
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else float('inf')
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def ci_width(self, confidence=0.95):
+        # Full width of the Student t confidence interval on the mean
+        if self.count < 2:
+            return float('inf')
+        return 2 * t_quantile(0.5 + confidence / 2, self.count - 1) * self.std / math.sqrt(self.count)
+
+    def summary(self, confidence=0.95):
+        width = self.ci_width(confidence)
+        return {'count': self.count, 'mean': self.mean, 'std': self.std, 'ci_low': self.mean - width / 2,
+                'ci_high': self.mean + width / 2, 'ci_width': width}
+
+def t_quantile(p, df):
+    # Cornish-Fisher expansion of the Student t quantile around the normal one, well within
+    # a percent of the exact value from 3 degrees of freedom up
+    z = NormalDist().inv_cdf(p)
+    return (z + (z**3 + z) / (4 * df)
+            + (5 * z**5 + 16 * z**3 + 3 * z) / (96 * df**2)
+            + (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / (384 * df**3))
+
+def ci_target_reached(stats, target_width, relative_width, confidence):
+    width = stats.ci_width(confidence)
+    if target_width is not None and width <= target_width:
+        return True
+    return relative_width is not None and width <= relative_width * abs(stats.mean)
+
+def sequential_replications(replicate, target_width=None, relative_width=0.01, confidence=0.95, min_replications=10,
+                            max_replications=1000, base_seed=0):
+    # Calls replicate(seed) with a new replication seed each time until the confidence interval on
+    # the mean is at most target_width wide, or relative_width times the mean, or max_replications
+    # have run. min_replications guards against stopping on a lucky early variance estimate.
+    stats = RunningStats()
+    start = time.perf_counter()
+    stop_reason = 'max_replications'
+    for replication in range(max_replications):
+        stats.add(replicate(replication_seed(base_seed, replication)))
+        if stats.count >= min_replications and ci_target_reached(stats, target_width, relative_width, confidence):
+            stop_reason = 'ci_width'
+            break
+    return {**stats.summary(confidence), 'stop_reason': stop_reason, 'elapsed_s': time.perf_counter() - start}
+
+def paired_replications(replicate_a, replicate_b, target_width=None, relative_width=0.05, confidence=0.95,
+                        min_replications=10, max_replications=1000, base_seed=0):
+    # Common random numbers: both solvers get the same seed, so the same scenario, in each
+    # replication and the interval is on the paired difference a - b. relative_width is a
+    # fraction of the mean difference.
+    stats_a, stats_b, difference = RunningStats(), RunningStats(), RunningStats()
+    start = time.perf_counter()
+    stop_reason = 'max_replications'
+    for replication in range(max_replications):
+        seed = replication_seed(base_seed, replication)
+        latency_a, latency_b = replicate_a(seed), replicate_b(seed)
+        stats_a.add(latency_a)
+        stats_b.add(latency_b)
+        difference.add(latency_a - latency_b)
+        if difference.count >= min_replications and ci_target_reached(difference, target_width, relative_width, confidence):
+            stop_reason = 'ci_width'
+            break
+    return {
+        'difference': difference.summary(confidence),
+        'a': stats_a.summary(confidence),
+        'b': stats_b.summary(confidence),
+        'stop_reason': stop_reason,
+        'elapsed_s': time.perf_counter() - start
+    }
+
+def method_replicate(method, alpha=0.498, number_of_runs=100):
+    # replicate(seed) for sequential_replications, one test(), basic() or bottleneck() on a fresh scenario
+    def replicate(seed):
+        return run_replication(method, alpha, number_of_runs, seed)[0]
+    return replicate
@@ -1,39 +1,122 @@
 from model import *
+from compact_graph import CompactOffloadingGraph
+from fleet_state import FleetState
+from capacity_ledger import CapacityLedger
+from instrumentation import NULL_PROFILER
+from bisect import bisect_left, bisect_right
+import heapq
+import math
+import networkx as nx
+import numpy as np
+
+def calculate_latencies(task_sizes_MB, VU_GFLOPS_values, RSU_GFLOPS_value=None, HAP_GFLOPS_value=None, Bandwidth_uplink=10, Bandwidth_downlink=20):
+    # Batched version of calculate_latency, one entry per task
+    if RSU_GFLOPS_value is None:
+        RSU_GFLOPS_value = RSU_GFLOPS
+    if HAP_GFLOPS_value is None:
+        HAP_GFLOPS_value = HAP_GFLOPS
+    task_sizes_MB = np.asarray(task_sizes_MB)
+    VU_GFLOPS_values = np.asarray(VU_GFLOPS_values)
 
-def calculate_latency(task, VU, RSUs, HAP, Bandwidth_uplink=10, Bandwidth_downlink=20):
     # Correctly convert bandwidth from Gbps to bps for calculation
     Bandwidth_uplink_bps = Bandwidth_uplink * 10**9
     Bandwidth_downlink_bps = Bandwidth_downlink * 10**9
 
     # Convert task_MB into bits for calculation
-    task_bits = task['size_MB'] * 8 * 10**6
+    task_bits = task_sizes_MB * 8 * 10**6
 
     # Calculate uplink and downlink transmission latency in ms
     uplink_latency = (task_bits / Bandwidth_uplink_bps) * 1000  # Convert seconds to ms
-    downlink_latency = (task_bits / (5 *Bandwidth_downlink_bps)) * 1000  # Convert seconds to ms
-    
+    downlink_latency = (task_bits / (5 * Bandwidth_downlink_bps)) * 1000  # Convert seconds to ms
+
     # VU Processing Latency (No transmission latency considered)
-    vu_processing_latency = ((1000* task_bits) / (VU['GFLOPS'] * 10**9)) * 1000  
-    
+    vu_processing_latency = ((1000 * task_bits) / (VU_GFLOPS_values * 10**9)) * 1000
+
     # Assuming RSU is chosen based on coverage and load; similarly for HAP
-    rsu_processing_latency = ((1000 * task_bits) / (RSU_GFLOPS * 10**9)) * 1000
-    hap_processing_latency = ((1000 * task_bits) / (HAP_GFLOPS * 10**9)) * 1000
-    
+    rsu_processing_latency = ((1000 * task_bits) / (RSU_GFLOPS_value * 10**9)) * 1000
+    hap_processing_latency = ((1000 * task_bits) / (HAP_GFLOPS_value * 10**9)) * 1000
+
     # Total latency for offloading to RSU and HAP includes transmission and processing latencies
     rsu_total_latency = uplink_latency + rsu_processing_latency + downlink_latency
     hap_total_latency = uplink_latency + hap_processing_latency + downlink_latency
-    
+
     return {
         'VU_latency': vu_processing_latency,
         'RSU_latency': rsu_total_latency,
         'HAP_latency': hap_total_latency
     }
 
-def find_valid_rsu(VU, RSUs):
+def calculate_task_latencies(VUs):
+    # Flatten every VU task into arrays and compute all latencies in one pass
+    if isinstance(VUs, FleetState):
+        latencies = calculate_latencies(VUs.task_size_MB, VUs.gflops[VUs.task_owner])
+        return VUs.task_nodes(), latencies, VUs.task_max_latency_ms
+
+    task_nodes = []
+    deadlines = []
+    sizes = []
+    gflops = []
+    for vu_id, vu in VUs.items():
+        for task in vu['tasks']:
+            task_nodes.append(f"{vu_id}_{task['id']}")
+            sizes.append(task['size_MB'])
+            deadlines.append(task['max_latency_ms'])
+            gflops.append(vu['GFLOPS'])
+
+    latencies = calculate_latencies(np.array(sizes), np.array(gflops))
+    return task_nodes, latencies, np.array(deadlines)
+
+def calculate_latency(task, VU, RSUs, HAP, Bandwidth_uplink=10, Bandwidth_downlink=20):
+    latencies = calculate_latencies(task['size_MB'], VU['GFLOPS'], Bandwidth_uplink=Bandwidth_uplink, Bandwidth_downlink=Bandwidth_downlink)
+    return {key: float(value) for key, value in latencies.items()}
+
+class RSUCoverageIndex:
+    # RSU centres sorted by position so coverage lookups only check nearby RSUs
+    def __init__(self, RSUs):
+        ordered = sorted(enumerate(RSUs.items()), key=lambda item: item[1][1]['position'])
+        self.order = [order for order, _ in ordered]  # Position of each RSU in the RSUs dict
+        self.rsu_items = [item for _, item in ordered]
+        self.positions = [rsu['position'] for _, rsu in self.rsu_items]
+        self.position_array = np.array(self.positions, dtype=float)
+        self.max_coverage = max((rsu['coverage'] for _, rsu in self.rsu_items), default=0)
+
+    def candidate_range(self, position):
+        # One extra RSU either side guards against rounding at the coverage edge
+        lo = max(bisect_left(self.positions, position - self.max_coverage) - 1, 0)
+        hi = min(bisect_right(self.positions, position + self.max_coverage) + 1, len(self.positions))
+        return lo, hi
+
+    def candidates(self, lo, hi):
+        # Check candidates in the original RSUs order so ties resolve like a linear scan
+        return [self.rsu_items[i] for i in sorted(range(lo, hi), key=self.order.__getitem__)]
+
+    def find_valid_rsu(self, VU):
+        return best_rsu_in_coverage(VU, self.candidates(*self.candidate_range(VU['position'])))
+
+    def find_valid_rsus(self, VUs):
+        # Batched lookup for every VU, returns {vu_id: best_rsu}
+        if isinstance(VUs, FleetState):
+            positions = VUs.position
+        else:
+            positions = np.array([vu['position'] for vu in VUs.values()], dtype=float)
+        lo = np.maximum(np.searchsorted(self.position_array, positions - self.max_coverage, side='left') - 1, 0)
+        hi = np.minimum(np.searchsorted(self.position_array, positions + self.max_coverage, side='right') + 1, len(self.positions))
+
+        valid_rsus = {}
+        for (vu_id, vu), start, end in zip(VUs.items(), lo.tolist(), hi.tolist()):
+            valid_rsus[vu_id] = best_rsu_in_coverage(vu, self.candidates(start, end))
+        return valid_rsus
+
+def find_valid_rsu(VU, RSUs, rsu_index=None):
+    if rsu_index is not None:
+        return rsu_index.find_valid_rsu(VU)
+    return best_rsu_in_coverage(VU, RSUs.items())
+
+def best_rsu_in_coverage(VU, rsu_items):
     best_rsu = None
     min_distance_to_leave_coverage = float('inf')  # Initialise with a very large number
 
-    for rsu_id, rsu in RSUs.items():
+    for rsu_id, rsu in rsu_items:
         distance_to_rsu_center = abs(VU['position'] - rsu['position'])
         if distance_to_rsu_center <= rsu['coverage']:
             if VU['direction'] == 'right':
@@ -56,61 +139,311 @@ def find_valid_rsu(VU, RSUs):
 
     return best_rsu
 
-def generate_initial_solution(G, alpha):
+def graph_task_nodes(G):
+    if isinstance(G, CompactOffloadingGraph):
+        return G.task_nodes_alive()
+    return list(G.nodes())
+
+def graph_task_edges(G, task_node):
+    # Outgoing (server, weight) pairs of a task node for either graph layout
+    if isinstance(G, CompactOffloadingGraph):
+        return G.task_edges(task_node)
+    return [(target, data['weight']) for _, target, data in G.out_edges(task_node, data=True)]
+
+def remove_graph_tasks(G, task_nodes):
+    if isinstance(G, CompactOffloadingGraph):
+        G.remove_task_nodes(task_nodes)
+    else:
+        G.remove_nodes_from(task_nodes)
+
+def create_warm_start():
+    # State carried between the rounds of one run by a warm-started generate_initial_solution
+    return {
+        'picks': {},  # {task_node: (edges, rcl, selected_edge)} for tasks not offloaded yet
+        'placed': {},  # {vu_id: (eligible servers, server)} where the last improvement step left each VU's task
+        'full': set(),  # Servers with no free slot when the last round ended
+        'reused': 0,  # Tasks that kept last round's pick, their edges were unchanged and its server had room
+        'redrawn': 0,  # Tasks with unchanged edges drawn again from last round's RCL as the pick's server filled up
+        'repaired': 0  # Tasks whose eligible servers changed, so their RCL was rebuilt
+    }
+
+def task_vu_id(task_node):
+    # 'VU_1_Task 1' -> 'VU_1'
+    return '_'.join(task_node.split('_')[:2])
+
+def seed_from_warm_start(solution, G, warm_start, ledger):
+    # Starts the improvement step from last round's assignment. A task whose VU can reach the same
+    # servers as last round moves to the server the improvement step left that VU's task on, when
+    # it is cheaper and has a free slot. Returns {task_node: server} for the tasks moved.
+    seeded = {}
+    for task_node, (assigned_to, latency) in list(solution.items()):
+        placed = warm_start['placed'].get(task_vu_id(task_node))
+        if placed is None or placed[1] == assigned_to:
+            continue
+        edges = dict(graph_task_edges(G, task_node))
+        servers, target = placed
+        if frozenset(edges) == servers and edges[target] < latency and ledger.has_capacity(target):
+            ledger.move(assigned_to, target)
+            solution[task_node] = (target, edges[target])
+            seeded[task_node] = target
+    return seeded
+
+def record_placements(solution, G, warm_start):
+    # Keeps where each VU's task ended up for the next round's seed_from_warm_start
+    for task_node, (assigned_to, _) in solution.items():
+        servers = frozenset(target for target, _ in graph_task_edges(G, task_node))
+        warm_start['placed'][task_vu_id(task_node)] = (servers, assigned_to)
+
+def generate_initial_solution(G, alpha, ledger, warm_start=None, remove_offloaded=True):
+    # Chosen servers get a slot reserved in ledger, a CapacityLedger built from the RSUs' and
+    # HAP's max_tasks, so slots still held by earlier tasks are respected. With a warm_start,
+    # a task whose edges are the same as last round reuses its RCL, and keeps last round's pick
+    # unless that server ended the round full. With remove_offloaded False the offloaded tasks
+    # stay in G so an improvement step still sees their edges, the caller removes them afterwards.
     solution = {}
-    capacity = {'HAP': 0, **{f'RSU_{i}': 0 for i in range(1, RSU_n + 1)}}
     tasks_to_remove = []
 
-    for task_node in G.nodes():
-        edges = list(G.out_edges(task_node, data=True))
+    for task_node in graph_task_nodes(G):
+        edges = graph_task_edges(G, task_node)
         if not edges:
             continue
-        # Apply a randomised selection based on alpha
-        edges = sorted(edges, key=lambda x: x[2]['weight'])
-        threshold = int(len(edges) * alpha)
-        selected_edge = random.choice(edges[:max(1, threshold)])
-
-        _, target, data = selected_edge
-        if target.startswith('RSU') and capacity[target] < 10 or target == 'HAP' and capacity[target] < 5:
-            capacity[target] += 1
-            solution[task_node] = (target, data['weight'])
+        previous = warm_start['picks'].get(task_node) if warm_start is not None else None
+        if previous is not None and previous[0] != edges:
+            previous = None
+        if previous is not None and previous[2][0] not in warm_start['full']:
+            rcl, selected_edge = previous[1], previous[2]
+            warm_start['reused'] += 1
+        else:
+            if previous is not None:
+                rcl = previous[1]
+                warm_start['redrawn'] += 1
+            else:
+                # Apply a randomised selection based on alpha
+                sorted_edges = sorted(edges, key=lambda x: x[1])
+                threshold = int(len(sorted_edges) * alpha)
+                rcl = sorted_edges[:max(1, threshold)]
+                if warm_start is not None:
+                    warm_start['repaired'] += 1
+            selected_edge = random.choice(rcl)
+            if warm_start is not None:
+                warm_start['picks'][task_node] = (edges, rcl, selected_edge)
+
+        target, weight = selected_edge
+        if ledger.reserve(target):
+            solution[task_node] = (target, weight)
             tasks_to_remove.append(task_node)
+            if warm_start is not None:
+                del warm_start['picks'][task_node]
 
-    G.remove_nodes_from(tasks_to_remove)
+    if remove_offloaded:
+        remove_graph_tasks(G, tasks_to_remove)
     return solution, bool(tasks_to_remove)
 
-def local_search(solution, G, VUs, RSUs, HAP):
+def solve_bottleneck_assignment(G, RSUs, HAP, ledger=None):
+    # Exact alternative to generate_initial_solution for one round. Offloads as many tasks as the
+    # free slots in ledger allow while minimising the largest assigned latency. Binary searches
+    # the sorted edge weights, checking each threshold with a capacitated max-flow over the edges
+    # at or below it.
+    edges = [(task_node, target, weight) for task_node in graph_task_nodes(G) for target, weight in graph_task_edges(G, task_node)]
+    if not edges:
+        return {}, False
+
+    if ledger is None:
+        ledger = CapacityLedger.from_servers(RSUs, HAP)
+    capacities = {server: ledger.free_slots(server) for server in ledger.servers}
+
+    def max_flow(threshold):
+        F = nx.DiGraph()
+        F.add_node('source')
+        F.add_node('sink')
+        for task_node, target, weight in edges:
+            if weight <= threshold:
+                F.add_edge('source', ('task', task_node), capacity=1)
+                F.add_edge(('task', task_node), ('server', target), capacity=1)
+        for server, capacity in capacities.items():
+            if ('server', server) in F:
+                F.add_edge(('server', server), 'sink', capacity=capacity)
+        return nx.maximum_flow(F, 'source', 'sink')
+
+    weights = sorted({weight for _, _, weight in edges})
+    most_tasks, _ = max_flow(weights[-1])
+
+    # Smallest threshold that still lets the maximum number of tasks through
+    lo, hi = 0, len(weights) - 1
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if max_flow(weights[mid])[0] == most_tasks:
+            hi = mid
+        else:
+            lo = mid + 1
+    _, flow = max_flow(weights[lo])
+
+    edge_weights = {(task_node, target): weight for task_node, target, weight in edges}
+    solution = {}
+    for node, out_flow in flow.items():
+        if node in ('source', 'sink') or node[0] != 'task':
+            continue
+        for (_, server), amount in out_flow.items():
+            if amount > 0:
+                solution[node[1]] = (server, edge_weights[(node[1], server)])
+                ledger.reserve(server)
+
+    remove_graph_tasks(G, list(solution))
+    return solution, bool(solution)
+
+# The improvement steps take the ledger the solution's slots were reserved in. Without one
+# they start from a ledger holding exactly the solution's assignments.
+
+def local_search(solution, G, VUs, RSUs, HAP, strategy='rescan', profiler=NULL_PROFILER, ledger=None):
+    # 'rescan' repeats first-improvement passes over the solution, 'queue' applies the best moves first
+    if strategy == 'queue':
+        return local_search_queue(solution, G, VUs, RSUs, HAP, profiler, ledger)
+    if ledger is None:
+        ledger = CapacityLedger.from_solution(RSUs, HAP, solution)
+
     improved = True
-    decision_vector = {}  # Initialise the decision vector
+    # Initialise the decision vector with the initial assignments
+    decision_vector = {task_node: get_offloading_option(assigned_to) for task_node, (assigned_to, _) in solution.items()}
     while improved:
         improved = False
         for task_node, (assigned_to, latency) in list(solution.items()):
-            decision_vector[task_node] = get_offloading_option(assigned_to)  # Initial assignment
-            for edge in G.edges(task_node, data=True):
-                target = edge[1]
-                new_latency = edge[2]['weight']
-
+            for target, new_latency in graph_task_edges(G, task_node):
                 if new_latency < latency:
-                    if (target.startswith('RSU') and RSUs[target]['task_count'] < RSUs[target]['max_tasks']) or \
-                       (target == 'HAP' and HAP['task_count'] < HAP['max_tasks']):
+                    if ledger.has_capacity(target):
                         solution[task_node] = (target, new_latency)
-                        
-                        if assigned_to.startswith('RSU'):
-                            RSUs[assigned_to]['task_count'] -= 1
-                        elif assigned_to == 'HAP':
-                            HAP['task_count'] -= 1
-
-                        if target.startswith('RSU'):
-                            RSUs[target]['task_count'] += 1
-                        elif target == 'HAP':
-                            HAP['task_count'] += 1
-                        
+                        ledger.move(assigned_to, target)
                         decision_vector[task_node] = get_offloading_option(target)  # Update decision
+                        profiler.count('local_search_moves')
                         improved = True
                         break
 
     return solution, decision_vector
 
+def local_search_queue(solution, G, VUs, RSUs, HAP, profiler=NULL_PROFILER, ledger=None):
+    # Improving moves sit in a heap keyed by latency gain. After a move only the moved
+    # task's entries and the moves waiting on the server it left are looked at again.
+    if ledger is None:
+        ledger = CapacityLedger.from_solution(RSUs, HAP, solution)
+    decision_vector = {task_node: get_offloading_option(assigned_to) for task_node, (assigned_to, _) in solution.items()}
+    heap = []
+    waiting = {}  # Moves blocked by a full server, retried once that server frees a slot
+    sequence = 0  # Breaks ties in solution order
+
+    for task_node, (assigned_to, latency) in solution.items():
+        for target, new_latency in graph_task_edges(G, task_node):
+            if new_latency < latency:
+                heap.append((new_latency - latency, sequence, task_node, target, new_latency, latency))
+                sequence += 1
+    heapq.heapify(heap)
+
+    while heap:
+        entry = heapq.heappop(heap)
+        _, _, task_node, target, new_latency, base_latency = entry
+        assigned_to, latency = solution[task_node]
+        if new_latency >= latency:
+            continue  # The task has already moved somewhere at least as good
+        if latency != base_latency:
+            # Still improving but the gain changed, requeue with the current key
+            heapq.heappush(heap, (new_latency - latency, sequence, task_node, target, new_latency, latency))
+            sequence += 1
+            continue
+        if not ledger.has_capacity(target):
+            waiting.setdefault(target, []).append(entry)
+            continue
+
+        solution[task_node] = (target, new_latency)
+        ledger.move(assigned_to, target)
+        decision_vector[task_node] = get_offloading_option(target)  # Update decision
+        profiler.count('local_search_moves')
+
+        for waiting_entry in waiting.pop(assigned_to, []):
+            heapq.heappush(heap, waiting_entry)
+
+    return solution, decision_vector
+
+def restore_assignment(solution, best_solution, ledger):
+    # Move every task back to its assignment in best_solution, keeping the ledger in step
+    for task_node, (assigned_to, _) in solution.items():
+        if best_solution[task_node][0] != assigned_to:
+            ledger.move(assigned_to, best_solution[task_node][0])
+    solution.update(best_solution)
+
+def simulated_annealing(solution, G, VUs, RSUs, HAP, iterations=100, initial_temperature=50.0, cooling=0.95,
+                        profiler=NULL_PROFILER, ledger=None):
+    # Cheaper alternative to local_search for tight time budgets: a fixed number of random moves,
+    # worse ones accepted with probability exp(-increase / temperature). Returns the best assignment seen.
+    decision_vector = {task_node: get_offloading_option(assigned_to) for task_node, (assigned_to, _) in solution.items()}
+    task_nodes = [task_node for task_node in solution if graph_task_edges(G, task_node)]
+    if not task_nodes:
+        return solution, decision_vector
+    if ledger is None:
+        ledger = CapacityLedger.from_solution(RSUs, HAP, solution)
+
+    best_solution = dict(solution)
+    best_total = current_total = sum(latency for _, latency in solution.values())
+    temperature = initial_temperature
+    for _ in range(iterations):
+        task_node = random.choice(task_nodes)
+        assigned_to, latency = solution[task_node]
+        target, new_latency = random.choice(graph_task_edges(G, task_node))
+        increase = new_latency - latency
+        if target != assigned_to and ledger.has_capacity(target) and \
+           (increase < 0 or random.random() < math.exp(-increase / temperature)):
+            solution[task_node] = (target, new_latency)
+            ledger.move(assigned_to, target)
+            profiler.count('local_search_moves')
+            current_total += increase
+            if current_total < best_total:
+                best_total = current_total
+                best_solution = dict(solution)
+        temperature = max(temperature * cooling, 1e-9)
+
+    restore_assignment(solution, best_solution, ledger)
+    for task_node, (assigned_to, _) in solution.items():
+        decision_vector[task_node] = get_offloading_option(assigned_to)
+    return solution, decision_vector
+
+def tabu_search(solution, G, VUs, RSUs, HAP, iterations=20, tenure=5, profiler=NULL_PROFILER, ledger=None):
+    # Takes the best non-tabu move each iteration even if it is worse. Moving a task back to a
+    # server it just left is tabu for tenure iterations, unless it beats the best total.
+    if ledger is None:
+        ledger = CapacityLedger.from_solution(RSUs, HAP, solution)
+    decision_vector = {task_node: get_offloading_option(assigned_to) for task_node, (assigned_to, _) in solution.items()}
+    best_solution = dict(solution)
+    best_total = current_total = sum(latency for _, latency in solution.values())
+    tabu_until = {}  # (task_node, server) -> iteration the move is allowed again
+
+    for iteration in range(iterations):
+        best_move = None
+        for task_node, (assigned_to, latency) in solution.items():
+            for target, new_latency in graph_task_edges(G, task_node):
+                if target == assigned_to or not ledger.has_capacity(target):
+                    continue
+                increase = new_latency - latency
+                tabu = tabu_until.get((task_node, target), 0) > iteration
+                if tabu and current_total + increase >= best_total:
+                    continue
+                if best_move is None or increase < best_move[0]:
+                    best_move = (increase, task_node, target, new_latency)
+        if best_move is None:
+            break
+
+        increase, task_node, target, new_latency = best_move
+        assigned_to = solution[task_node][0]
+        solution[task_node] = (target, new_latency)
+        ledger.move(assigned_to, target)
+        tabu_until[(task_node, assigned_to)] = iteration + 1 + tenure
+        profiler.count('local_search_moves')
+        current_total += increase
+        if current_total < best_total:
+            best_total = current_total
+            best_solution = dict(solution)
+
+    restore_assignment(solution, best_solution, ledger)
+    for task_node, (assigned_to, _) in solution.items():
+        decision_vector[task_node] = get_offloading_option(assigned_to)
+    return solution, decision_vector
+
 def get_offloading_option(target):
     if 'RSU' in target:
         return 0  # RSU offloading
@@ -129,3 +462,15 @@ def format_decision_vector(decision_vector):
     decision_string = ''.join(str(dec) for _, dec in sorted_tasks)
     return decision_string
 
+
+def pack_decision_vector(decision_vector, task_nodes):
+    # One int8 per task in task_nodes order, -1 for tasks that were never offloaded
+    options = np.full(len(task_nodes), -1, dtype=np.int8)
+    for i, task_node in enumerate(task_nodes):
+        if task_node in decision_vector:
+            options[i] = decision_vector[task_node]
+    return options.tobytes()
+
+def unpack_decision_vector(packed, task_nodes):
+    options = np.frombuffer(packed, dtype=np.int8).tolist()
+    return {task_node: option for task_node, option in zip(task_nodes, options) if option != -1}
@@ -0,0 +1,189 @@
+import math
+import random
+import numpy as np
+from model import *
+
+# 2D mode: VUs drive along the directed segments of a road network instead of one straight road.
+# A VU's position is an (x, y) tuple and its direction a unit (dx, dy) tuple. It also keeps the
+# segment it is on, how far along it is, the segments it will take next and its own random
+# generator for turns, so every run of a scenario follows the same routes.
+
+class RoadNetwork:
+    def __init__(self, node_positions, segments):
+        # segments is a list of (start_node, end_node), each one a single driving direction
+        self.node_positions = np.asarray(node_positions, dtype=float)
+        self.segment_nodes = np.asarray(segments, dtype=np.int64).reshape(len(segments), 2)
+        vectors = self.node_positions[self.segment_nodes[:, 1]] - self.node_positions[self.segment_nodes[:, 0]]
+        self.lengths = np.hypot(vectors[:, 0], vectors[:, 1])
+        self.directions = vectors / self.lengths[:, None]
+        self.out_segments = [[] for _ in range(len(self.node_positions))]
+        for segment, (start, _) in enumerate(self.segment_nodes.tolist()):
+            self.out_segments[start].append(segment)
+
+    def point(self, segment, offset):
+        start = self.node_positions[self.segment_nodes[segment, 0]]
+        direction = self.directions[segment]
+        return float(start[0] + direction[0] * offset), float(start[1] + direction[1] * offset)
+
+    def next_segment(self, segment, rng):
+        # Random turn at the end of a segment, U-turns only at dead ends
+        start, end = self.segment_nodes[segment].tolist()
+        options = [s for s in self.out_segments[end] if self.segment_nodes[s, 1] != start]
+        return rng.choice(options or self.out_segments[end])
+
+    def route_segment(self, vu, i):
+        # The i-th segment after the VU's current one, drawing more turns as needed
+        while len(vu['route']) <= i:
+            last = vu['route'][-1] if vu['route'] else vu['segment']
+            vu['route'].append(self.next_segment(last, vu['rng']))
+        return vu['route'][i]
+
+    def move(self, vu, distance):
+        offset = vu['offset'] + distance
+        segment = vu['segment']
+        while offset >= self.lengths[segment]:
+            offset -= self.lengths[segment]
+            segment = self.route_segment(vu, 0)
+            vu['route'] = vu['route'][1:]
+        vu['segment'] = segment
+        vu['offset'] = offset
+        vu['position'] = self.point(segment, offset)
+        vu['direction'] = tuple(self.directions[segment].tolist())
+
+def grid_road_network(rows, cols, block_length):
+    # Manhattan grid of rows x cols intersections block_length metres apart, two-way roads
+    node_positions = [(c * block_length, r * block_length) for r in range(rows) for c in range(cols)]
+    segments = []
+    for r in range(rows):
+        for c in range(cols):
+            node = r * cols + c
+            if c + 1 < cols:
+                segments += [(node, node + 1), (node + 1, node)]
+            if r + 1 < rows:
+                segments += [(node, node + cols), (node + cols, node)]
+    return RoadNetwork(node_positions, segments)
+
+class RoadFleet(dict):
+    # VUs of the 2D mode, a plain {vu_id: vu} dict that also knows its road network
+    def __init__(self, network, VUs):
+        super().__init__(VUs)
+        self.network = network
+
+    def update_positions(self, elapsed_time_sec):
+        for vu in self.values():
+            self.network.move(vu, vu['speed'] * elapsed_time_sec)
+
+    def snapshot(self):
+        return {vu_id: {**vu, 'route': list(vu['route']), 'rng_state': vu['rng'].getstate()} for vu_id, vu in self.items()}
+
+    def restore(self, snapshot):
+        for vu_id, vu in self.items():
+            state = dict(snapshot[vu_id])
+            vu['rng'].setstate(state.pop('rng_state'))
+            state['route'] = list(state['route'])
+            state['rng'] = vu['rng']
+            vu.update(state)
+
+def initialise_road_VUs(network):
+    # Same fields and task draws as initialise_VUs, placed at a random point of a random segment
+    VUs = {}
+    for i in range(VU_m):
+        segment = random.randrange(len(network.lengths))
+        offset = random.uniform(0, float(network.lengths[segment]))
+        VUs[f'VU_{i+1}'] = {
+            'speed': VU_speed,
+            'GFLOPS': VU_GFLOPS,
+            'position': network.point(segment, offset),
+            'direction': tuple(network.directions[segment].tolist()),
+            'segment': segment,
+            'offset': offset,
+            'route': [],
+            'rng': random.Random(random.getrandbits(64)),
+            'tasks': [{
+                'id': f'Task {j+1}',
+                'size_MB': random.randint(1, 5),
+                'max_latency_ms': random.randint(300, 10000)
+            } for j in range(max_tasks_per_VU)]
+        }
+    return RoadFleet(network, VUs)
+
+def initialise_road_RSUs(network, spacing):
+    # An RSU at every intersection and every spacing metres along each road
+    positions = [tuple(position) for position in network.node_positions.tolist()]
+    for segment, (start, end) in enumerate(network.segment_nodes.tolist()):
+        if start < end:  # Both directions of a road share its RSUs
+            for k in range(1, int(network.lengths[segment] // spacing)):
+                if k * spacing < network.lengths[segment] - spacing / 2:
+                    positions.append(network.point(segment, k * spacing))
+    return {f'RSU_{i+1}': {
+        'GFLOPS': RSU_GFLOPS,
+        'position': position,
+        'coverage': RSU_coverage,
+        'max_tasks': 10
+    } for i, position in enumerate(positions)}
+
+class GridRSUIndex:
+    # Uniform grid hash of RSU centres with cells as wide as the largest coverage radius, so a
+    # lookup only checks the 3 x 3 cells around the VU. Drop-in rsu_index for the 2D mode.
+    MAX_PATH_SEGMENTS = 32  # Stop following the route after this many segments inside one coverage area
+    covering_rsu_only = True  # update_graph connects a task only to its VU's own RSU
+
+    def __init__(self, RSUs, network):
+        self.network = network
+        self.rsu_items = list(RSUs.items())
+        self.cell_size = max((rsu['coverage'] for rsu in RSUs.values()), default=1) or 1
+        self.cells = {}
+        for i, (_, rsu) in enumerate(self.rsu_items):
+            self.cells.setdefault(self.cell(rsu['position']), []).append(i)
+
+    def cell(self, position):
+        return int(math.floor(position[0] / self.cell_size)), int(math.floor(position[1] / self.cell_size))
+
+    def candidates(self, position):
+        # Nearby RSUs in the original RSUs order so ties resolve like a linear scan
+        cx, cy = self.cell(position)
+        indices = sorted(i for dx in (-1, 0, 1) for dy in (-1, 0, 1) for i in self.cells.get((cx + dx, cy + dy), ()))
+        return [self.rsu_items[i] for i in indices]
+
+    def distance_to_leave_coverage(self, VU, rsu):
+        # Distance along the VU's route until it leaves the RSU's coverage circle
+        network = self.network
+        centre, radius = rsu['position'], rsu['coverage']
+        segment, offset = VU['segment'], VU['offset']
+        travelled = 0.0
+        for i in range(self.MAX_PATH_SEGMENTS):
+            px, py = network.point(segment, offset)
+            dx, dy = network.directions[segment].tolist()
+            fx, fy = px - centre[0], py - centre[1]
+            b = fx * dx + fy * dy
+            exit_distance = -b + math.sqrt(max(b * b - (fx * fx + fy * fy - radius * radius), 0.0))
+            remaining = float(network.lengths[segment]) - offset
+            if exit_distance <= remaining:
+                return travelled + exit_distance
+            travelled += remaining
+            segment, offset = network.route_segment(VU, i), 0.0
+        return travelled
+
+    def best_rsu(self, VU, rsu_items):
+        # The 2D counterpart of best_rsu_in_coverage, the covering RSU the VU will leave first
+        best_rsu = None
+        min_distance_to_leave_coverage = float('inf')
+        x, y = VU['position']
+        for rsu_id, rsu in rsu_items:
+            if math.hypot(x - rsu['position'][0], y - rsu['position'][1]) <= rsu['coverage']:
+                distance_to_leave_coverage = self.distance_to_leave_coverage(VU, rsu)
+                if distance_to_leave_coverage < min_distance_to_leave_coverage:
+                    min_distance_to_leave_coverage = distance_to_leave_coverage
+                    best_rsu = {
+                        'rsu_id': rsu_id,
+                        'rsu_details': rsu,
+                        'distance_to_leave_coverage': distance_to_leave_coverage,
+                        'sojourn_time': (distance_to_leave_coverage / VU['speed']) * 1000
+                    }
+        return best_rsu
+
+    def find_valid_rsu(self, VU):
+        return self.best_rsu(VU, self.candidates(VU['position']))
+
+    def find_valid_rsus(self, VUs):
+        return {vu_id: self.find_valid_rsu(vu) for vu_id, vu in VUs.items()}
@@ -1,16 +1,32 @@
 from model import *
+from fleet_state import FleetState
+from road_network import RoadFleet
+from offloading_functions import RSUCoverageIndex, find_valid_rsu
+import heapq
+import numpy as np
 
 def store_initial_vu_states(VUs):
+    if isinstance(VUs, (FleetState, RoadFleet)):
+        return VUs.snapshot()
+
     initial_states = {}
     for vu_id, vu in VUs.items():
         initial_states[vu_id] = vu.copy()  
     return initial_states
 
 def reset_vus_to_initial_state(VUs, initial_states):
+    if isinstance(VUs, (FleetState, RoadFleet)):
+        VUs.restore(initial_states)
+        return
+
     for vu_id, vu in VUs.items():
         vu.update(initial_states[vu_id]) # Reset each VU to its initial state
 
 def update_vehicle_positions(VUs, elapsed_time_sec):
+    if isinstance(VUs, (FleetState, RoadFleet)):
+        VUs.update_positions(elapsed_time_sec)
+        return VUs
+
     for vu_id, vu in VUs.items():
         speed = vu['speed']
         direction = vu['direction']
@@ -19,4 +35,86 @@ def update_vehicle_positions(VUs, elapsed_time_sec):
             vu['position'] = min(vu['position'] + distance_moved, l)
         else:
             vu['position'] = max(vu['position'] - distance_moved, 0)
-    return VUs
\ No newline at end of file
+    return VUs
+
+class MobilityEventQueue:
+    # VUs move at a constant speed in a fixed direction, so the time each one next reaches an
+    # RSU coverage boundary has a closed form. Those times sit in a heap, and only VUs whose
+    # crossing is due are looked up again when time advances.
+    TIME_TOLERANCE = 1e-6  # Seconds, absorbs rounding between event times and moved positions
+    EVENT_EPSILON = 1e-9  # Seconds past an event so a VU leaving coverage is outside it
+
+    def __init__(self, VUs, RSUs, rsu_index=None, now=0.0):
+        self.VUs = VUs
+        self.RSUs = RSUs
+        self.rsu_index = rsu_index if rsu_index is not None else RSUCoverageIndex(RSUs)
+        edges = [rsu['position'] - rsu['coverage'] for rsu in RSUs.values()] + \
+                [rsu['position'] + rsu['coverage'] for rsu in RSUs.values()]
+        self.boundaries = np.unique(np.array(edges, dtype=float))
+        self.now = now
+        self.heap = []
+        self.sequence = {}  # Latest event per VU, older heap entries are skipped
+        self.current_rsu = {}
+        for vu_id, vu in VUs.items():
+            self.current_rsu[vu_id] = self._rsu_id(vu)
+            self._schedule(vu_id)
+
+    def _rsu_id(self, vu):
+        valid_rsu = find_valid_rsu(vu, self.RSUs, self.rsu_index)
+        return valid_rsu['rsu_id'] if valid_rsu else None
+
+    def next_crossing_time(self, vu):
+        position, speed = vu['position'], vu['speed']
+        if speed <= 0:
+            return float('inf')
+        if vu['direction'] == 'right':
+            i = np.searchsorted(self.boundaries, position, side='left')
+            if position >= l or i == len(self.boundaries) or self.boundaries[i] > l:
+                return float('inf')  # Stops at the end of the road before the next boundary
+            distance = self.boundaries[i] - position
+        else:
+            i = np.searchsorted(self.boundaries, position, side='right') - 1
+            if position <= 0 or i < 0 or self.boundaries[i] < 0:
+                return float('inf')
+            distance = position - self.boundaries[i]
+        return self.now + float(distance) / speed
+
+    def _schedule(self, vu_id):
+        event_time = self.next_crossing_time(self.VUs[vu_id])
+        sequence = self.sequence.get(vu_id, 0) + 1
+        self.sequence[vu_id] = sequence
+        if event_time != float('inf'):
+            heapq.heappush(self.heap, (event_time, sequence, vu_id))
+
+    def next_event_time(self):
+        while self.heap and self.heap[0][1] != self.sequence[self.heap[0][2]]:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else float('inf')
+
+    def advance(self, elapsed_time_sec):
+        # Moves every VU exactly like update_vehicle_positions and returns the ids of VUs whose RSU changed
+        update_vehicle_positions(self.VUs, elapsed_time_sec)
+        self.now += elapsed_time_sec
+
+        due = []
+        while self.heap and self.heap[0][0] <= self.now + self.TIME_TOLERANCE:
+            _, sequence, vu_id = heapq.heappop(self.heap)
+            if sequence == self.sequence[vu_id]:
+                due.append(vu_id)
+
+        changed = []
+        for vu_id in due:
+            rsu_id = self._rsu_id(self.VUs[vu_id])
+            if rsu_id != self.current_rsu[vu_id]:
+                self.current_rsu[vu_id] = rsu_id
+                changed.append(vu_id)
+            self._schedule(vu_id)
+        return changed
+
+    def advance_to_next_event(self):
+        # Skips straight past the next boundary crossing, returns (elapsed seconds, changed VU ids)
+        next_time = self.next_event_time()
+        if next_time == float('inf'):
+            return 0.0, []
+        elapsed = max(next_time - self.now, 0.0) + self.EVENT_EPSILON
+        return elapsed, self.advance(elapsed)
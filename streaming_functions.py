@@ -0,0 +1,217 @@
+from model import *
+from offloading_functions import *
+from simulation_functions import update_vehicle_positions
+from instrumentation import NULL_PROFILER
+import heapq
+import json
+import time
+import networkx as nx
+import numpy as np
+
+# Arrival processes yield (arrival_s, vu_id, task) in time order, task being a dict like the
+# ones initialise_VUs creates. Any iterable of such tuples can be streamed.
+
+def random_task(task_number, rng=random):
+    # Same draws as a task from initialise_VUs
+    return {
+        'id': f'Task {task_number}',
+        'size_MB': rng.randint(1, 5),
+        'max_latency_ms': rng.randint(300, 10000)
+    }
+
+def poisson_arrivals(VUs, rate_per_s, duration_s, start_s=0.0, rng=random):
+    # Every VU generates tasks as a Poisson process with rate_per_s tasks per second, merged
+    # into one stream. Task ids carry on from the VU's existing tasks.
+    task_numbers = {vu_id: len(vu['tasks']) for vu_id, vu in VUs.items()}
+    end_s = start_s + duration_s
+    heap = [(start_s + rng.expovariate(rate_per_s), i, vu_id) for i, vu_id in enumerate(VUs)]
+    heapq.heapify(heap)
+
+    while heap and heap[0][0] < end_s:
+        arrival_s, i, vu_id = heapq.heappop(heap)
+        task_numbers[vu_id] += 1
+        yield arrival_s, vu_id, random_task(task_numbers[vu_id], rng)
+        heapq.heappush(heap, (arrival_s + rng.expovariate(rate_per_s), i, vu_id))
+
+def trace_arrivals(path):
+    # Replays a JSONL trace, one {"time_s", "vu_id", "size_MB", "max_latency_ms"} object per line,
+    # with an optional "id". Lines must be in time order.
+    task_numbers = {}
+    last_s = float('-inf')
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            arrival_s, vu_id = float(record['time_s']), record['vu_id']
+            if arrival_s < last_s:
+                raise ValueError(f"Trace {path} is not in time order at {arrival_s}s")
+            last_s = arrival_s
+            task_numbers[vu_id] = task_numbers.get(vu_id, 0) + 1
+            yield arrival_s, vu_id, {
+                'id': record.get('id', f'Task {task_numbers[vu_id]}'),
+                'size_MB': record['size_MB'],
+                'max_latency_ms': record['max_latency_ms']
+            }
+
+def micro_batches(arrivals, interval_s, start_s=0.0):
+    # Groups a stream into consecutive windows of interval_s seconds, yields (window_end_s, arrivals).
+    # Empty windows are yielded too, so time keeps moving between arrivals.
+    window_end = start_s + interval_s
+    batch = []
+    for arrival in arrivals:
+        while arrival[0] >= window_end:
+            yield window_end, batch
+            batch = []
+            window_end += interval_s
+        batch.append(arrival)
+    yield window_end, batch
+
+def create_stream_state(RSUs, HAP, rsu_index=None, now=0.0):
+    # State kept between micro-batches of a stream
+    return {
+        'graph': nx.DiGraph(),  # Task nodes waiting to be offloaded
+        'pending': {},  # {task_node: (vu_id, task, arrival_s)} for tasks in the graph
+        'ledger': CapacityLedger.from_servers(RSUs, HAP),  # Running tasks hold a slot until they complete
+        'rsu_index': rsu_index if rsu_index is not None else RSUCoverageIndex(RSUs),
+        'now': now,
+        'tasks_arrived': 0,
+        'tasks_scheduled': 0,
+        'tasks_completed': 0,
+        'deadline_misses': 0,
+        'response_ms': 0.0,  # Sum of arrival to completion times of scheduled tasks
+        'decision_vector': {}
+    }
+
+def release_completed_tasks(state):
+    # Frees the server slot of every task that has finished by now
+    released = state['ledger'].release_due(state['now'])
+    state['tasks_completed'] += released
+    return released
+
+def refresh_pending_edges(state, VUs, RSUs):
+    # Rebuilds the edges of every waiting task against its remaining deadline, like
+    # create_offloading_graph. Tasks that no server could finish in time any more are
+    # dropped and returned.
+    G, pending, now = state['graph'], state['pending'], state['now']
+    if not pending:
+        return []
+
+    task_nodes = list(pending)
+    latencies = calculate_latencies(
+        np.array([pending[task_node][1]['size_MB'] for task_node in task_nodes]),
+        np.array([VUs[pending[task_node][0]]['GFLOPS'] for task_node in task_nodes])
+    )
+    rsu_latencies = latencies['RSU_latency'].tolist()
+    hap_latencies = latencies['HAP_latency'].tolist()
+
+    valid_rsus = {}
+    expired = []
+    G.remove_edges_from(list(G.edges()))
+    for i, task_node in enumerate(task_nodes):
+        vu_id, task, arrival_s = pending[task_node]
+        remaining_ms = task['max_latency_ms'] - (now - arrival_s) * 1000
+        if min(rsu_latencies[i], hap_latencies[i]) > remaining_ms:
+            expired.append(task_node)
+            continue
+
+        if vu_id not in valid_rsus:
+            valid_rsus[vu_id] = find_valid_rsu(VUs[vu_id], RSUs, state['rsu_index'])
+        valid_rsu = valid_rsus[vu_id]
+        if valid_rsu and rsu_latencies[i] <= remaining_ms:
+            G.add_edge(task_node, valid_rsu['rsu_id'], weight=rsu_latencies[i], type='RSU')
+        if hap_latencies[i] <= remaining_ms:
+            G.add_edge(task_node, "HAP", weight=hap_latencies[i], type='HAP')
+
+    G.remove_nodes_from(expired)
+    for task_node in expired:
+        del pending[task_node]
+    return expired
+
+def schedule_micro_batch(state, VUs, RSUs, HAP, window_end, arrivals, alpha, improve=local_search,
+                         profiler=NULL_PROFILER, remove_before_improve=False):
+    # Moves the VUs to window_end, releases finished tasks, admits the window's arrivals and
+    # offloads as many waiting tasks as the free server slots allow. Returns the solution.
+    with profiler.phase('update_vehicle_positions'):
+        update_vehicle_positions(VUs, window_end - state['now'])
+    state['now'] = window_end
+
+    with profiler.phase('release_tasks'):
+        profiler.count('tasks_released', release_completed_tasks(state))
+
+    with profiler.phase('admit_tasks'):
+        # A task id may be reused once the earlier task has been offloaded, not while it still waits
+        task_nodes = [f"{vu_id}_{task['id']}" for _, vu_id, task in arrivals]
+        seen, duplicates = set(), set()
+        for task_node in task_nodes:
+            if task_node in seen or task_node in state['pending']:
+                duplicates.add(task_node)
+            seen.add(task_node)
+        if duplicates:
+            raise ValueError(f"Tasks already waiting to be offloaded: {sorted(duplicates)}")
+        for task_node, (arrival_s, vu_id, task) in zip(task_nodes, arrivals):
+            state['pending'][task_node] = (vu_id, task, arrival_s)
+            state['graph'].add_node(task_node)
+        state['tasks_arrived'] += len(arrivals)
+        expired = refresh_pending_edges(state, VUs, RSUs)
+        state['deadline_misses'] += len(expired)
+        profiler.count('deadline_misses', len(expired))
+
+    with profiler.phase('generate_initial_solution'):
+        solution, offloaded_any = generate_initial_solution(state['graph'], alpha, state['ledger'],
+                                                            remove_offloaded=remove_before_improve)
+    if offloaded_any and improve is not None:
+        with profiler.phase('local_search'):
+            solution, decision_vector = improve(solution, state['graph'], VUs, RSUs, HAP, profiler=profiler,
+                                                ledger=state['ledger'])
+    if not remove_before_improve:
+        remove_graph_tasks(state['graph'], list(solution))
+
+    for task_node, (server, latency) in solution.items():
+        _, _, arrival_s = state['pending'].pop(task_node)
+        completion_s = state['now'] + latency / 1000
+        state['ledger'].release_at(server, completion_s)
+        state['response_ms'] += (completion_s - arrival_s) * 1000
+        state['decision_vector'][task_node] = get_offloading_option(server)
+    state['tasks_scheduled'] += len(solution)
+    profiler.count('tasks_offloaded', len(solution))
+    return solution
+
+def stream_grasp(VUs, RSUs, HAP, arrivals, alpha, batch_interval_s=504.5 / 1000, rsu_index=None,
+                 improve=local_search, profiler=NULL_PROFILER, remove_before_improve=False):
+    # Online mode: tasks arrive over time and are scheduled in micro-batches of batch_interval_s
+    # simulated seconds. Once the arrivals run out, waiting tasks are drained until each has been
+    # offloaded or has missed its deadline. Throughput is tasks scheduled per wall-clock second
+    # spent scheduling.
+    state = create_stream_state(RSUs, HAP, rsu_index)
+    start = time.perf_counter()
+    batches = 0
+
+    def run_batch(window_end, batch):
+        solution = schedule_micro_batch(state, VUs, RSUs, HAP, window_end, batch, alpha, improve, profiler,
+                                        remove_before_improve)
+        profiler.end_round(now_s=window_end, arrivals=len(batch), offloaded=len(solution),
+                           pending=len(state['pending']))
+
+    for window_end, batch in micro_batches(arrivals, batch_interval_s, state['now']):
+        run_batch(window_end, batch)
+        batches += 1
+    while state['pending']:
+        run_batch(state['now'] + batch_interval_s, [])
+        batches += 1
+
+    elapsed = time.perf_counter() - start
+    profiler.end_run(alpha=alpha, tasks_scheduled=state['tasks_scheduled'], deadline_misses=state['deadline_misses'])
+    return {
+        'tasks_arrived': state['tasks_arrived'],
+        'tasks_scheduled': state['tasks_scheduled'],
+        'tasks_completed': state['tasks_completed'],
+        'deadline_misses': state['deadline_misses'],
+        'deadline_miss_rate': state['deadline_misses'] / state['tasks_arrived'] if state['tasks_arrived'] else 0.0,
+        'mean_response_ms': state['response_ms'] / state['tasks_scheduled'] if state['tasks_scheduled'] else 0.0,
+        'throughput_tasks_per_s': state['tasks_scheduled'] / elapsed if elapsed > 0 else float('inf'),
+        'batches': batches,
+        'simulated_s': state['now'],
+        'elapsed_s': elapsed,
+        'decision_vector': state['decision_vector']
+    }